@@ -1,6 +1,54 @@
+import argparse
+
+from autopilot import Autopilot
 from game import Vector
+from netplay import start_server
+from replay import Recorder, read_recording
 
 if __name__ == "__main__":
-    while True:
-        vector = Vector()
-        vector.main_loop()
+    parser = argparse.ArgumentParser(description="Play Vector")
+    parser.add_argument("--record", metavar="FILE", help="save the input of every round to FILE")
+    parser.add_argument("--replay", metavar="FILE", help="watch a recording at normal speed, "
+                                                         "use replay.py to play it back as fast as possible")
+    parser.add_argument("--profile", action="store_true", help="start with the profiler overlay on (F3)")
+    parser.add_argument("--world", metavar="WIDTHxHEIGHT", help="play in a world bigger than the screen")
+    parser.add_argument("--asteroids", type=int, help="how many asteroids each round starts with")
+    parser.add_argument("--numpy", action="store_true", help="use the numpy entity store")
+    parser.add_argument("--server", action="store_true", help="run the game in a server process that "
+                                                              "other players on this machine can watch")
+    parser.add_argument("--watch", action="store_true", help="watch a game played with --server")
+    parser.add_argument("--port", type=int, default=5151, help="port of the server (default 5151)")
+    parser.add_argument("--particles", type=int, metavar="N", help="the most particles on the screen at once, "
+                                                                    "0 turns them off")
+    parser.add_argument("--autopilot", action="store_true", help="let the computer fly the ship, "
+                                                                 "soak.py runs it for a long time and reports on it")
+    parser.add_argument("--rewind", action="store_true", help="keep the last 10 seconds so R can wind the game "
+                                                              "back 3 seconds, not in a large world")
+    args = parser.parse_args()
+    if args.autopilot and (args.server or args.watch):
+        parser.error("--autopilot can't be used with --server or --watch")
+    # A watched game is played with someone else's input
+    if args.watch and (args.record or args.replay):
+        parser.error("--record and --replay can't be used with --watch")
+
+    world_size = tuple(int(x) for x in args.world.split("x")) if args.world else None
+
+    # A replay is played in the world its rounds were recorded in, the tuning is taken from each round
+    recording = read_recording(args.replay) if args.replay else None
+    if recording and world_size is None:
+        world_size = recording[0].size
+    tuning = {"START_ASTEROIDS": args.asteroids} if args.asteroids else None
+
+    # The server keeps running in its own process until the player quits
+    server = None
+    if args.server:
+        server = start_server(("localhost", args.port), world_size or (1200, 600), tuning, args.numpy)[1]
+    elif args.watch:
+        server = ("localhost", args.port)
+
+    # The session keeps the window, sounds and settings for every round
+    recorder = Recorder(args.record) if args.record else None
+    vector = Vector(args.numpy, profile=args.profile, recorder=recorder, world_size=world_size, tuning=tuning,
+                    server=server, spectate=args.watch, particles=args.particles,
+                    autopilot=Autopilot() if args.autopilot else None, rewind=args.rewind)
+    vector.main_loop(recording)
@@ -0,0 +1,117 @@
+import os
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from pygame.image import load
+from pygame.mixer import Sound
+from pygame.transform import rotozoom
+
+from utils import OPAQUE_SPRITES, expect_sprite, store_sprite, store_sound
+
+
+# Reads a sprite and builds its scaled variants and rotations, this runs on a worker thread.
+# Surfaces can only be converted to the display's format on the main thread, so that is left to AssetLoader.poll
+def _decode_sprite(name, scales, rotation_step):
+    sprite = load(f"assets/sprites/{name}.png")
+    surfaces = {(name, 1): sprite}
+    for scale in scales:
+        if scale != 1:
+            surfaces[(name, scale)] = rotozoom(sprite, 0, scale)
+    if rotation_step:
+        surfaces[(name, "rotations", rotation_step)] = [rotozoom(sprite, i * rotation_step, 1.0)
+                                                        for i in range(round(360 / rotation_step))]
+    return surfaces
+
+
+# Reads only the width and height of a sprite, from the IHDR chunk at the start of every PNG file
+def _read_size(name):
+    with open(f"assets/sprites/{name}.png", 'rb') as f:
+        header = f.read(24)
+    if header[:8] != b"\x89PNG\r\n\x1a\n":
+        raise ValueError("not a PNG file")
+    return struct.unpack(">II", header[16:24])
+
+
+def _decode_sound(name):
+    return Sound(f"assets/sounds/{name}.wav")
+
+
+# Loads the sprites and sounds in the assets folder on a pool of worker threads while the game keeps running.
+# Call poll() every frame, it finishes whatever the workers are done with and puts it in the asset caches.
+# Assets that are only needed later on (like the powerups) can be loaded lazily, poll() doesn't count them
+# as left to load, so the game can start while they are still on their way. Only their sizes are waited for,
+# until they are in load_sprite hands out placeholders of that size, so the main loop never reads from disk.
+# An asset that can't be loaded is reported and left out, errors are kept in failed
+class AssetLoader:
+
+    def __init__(self, workers=4):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="assets")
+        self.pending = {}
+        self.total = 0
+        self.loaded = 0
+        self.failed = {}
+
+    # Starts loading every asset. scales maps a sprite name to the scaled variants it needs,
+    # rotations maps a sprite name to the step in degrees of its pre-rendered rotations,
+    # and sprites whose names start with one of the lazy prefixes are not waited for
+    def load(self, scales=None, rotations=None, lazy=()):
+        scales = scales or {}
+        rotations = rotations or {}
+        later = []
+        for file in sorted(os.listdir("assets/sprites")):
+            name, extension = os.path.splitext(file)
+            if extension == ".png":
+                if name.startswith(tuple(lazy)):
+                    self._add(self.executor.submit(_read_size, name), "size", name, True)
+                    later.append(name)
+                else:
+                    future = self.executor.submit(_decode_sprite, name, scales.get(name, (1,)), rotations.get(name))
+                    self._add(future, "sprite", name, True)
+        for file in sorted(os.listdir("assets/sounds")):
+            name, extension = os.path.splitext(file)
+            if extension == ".wav":
+                self._add(self.executor.submit(_decode_sound, name), "sound", name, True)
+
+        # The lazy sprites are queued last so they don't hold up anything needed to start
+        for name in later:
+            future = self.executor.submit(_decode_sprite, name, scales.get(name, (1,)), rotations.get(name))
+            self._add(future, "sprite", name, False)
+
+    def _add(self, future, kind, name, needed):
+        self.pending[future] = (kind, name, needed)
+        if needed:
+            self.total += 1
+
+    # Stores the assets that finished loading, never waits for the ones that haven't.
+    # Returns how many of the assets needed to start are still loading
+    def poll(self):
+        for future in [future for future in self.pending if future.done()]:
+            kind, name, needed = self.pending.pop(future)
+            if needed:
+                self.loaded += 1
+            try:
+                result = future.result()
+            except Exception as error:
+                self.failed[(kind, name)] = error
+                print(f"Could not load the {kind} of {name}: {error}", file=sys.stderr)
+                continue
+            if kind == "sprite":
+                for key, surface in result.items():
+                    store_sprite(key, surface, name not in OPAQUE_SPRITES)
+            elif kind == "size":
+                expect_sprite(name, result)
+            else:
+                store_sound(name, result)
+        return self.total - self.loaded
+
+    # How much of what is needed to start has been loaded, from 0 to 1
+    def progress(self):
+        return self.loaded / self.total if self.total else 1
+
+    # True once every asset, including the lazy ones, is in the caches
+    def finished(self):
+        return not self.pending
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,70 @@
+import pygame
+
+from utils import load_sound
+
+
+# Plays the game's sound effects.
+# Each effect has one Sound and its own group of reserved mixer channels, so a burst of laser shots can't cut off
+# an explosion. An effect triggered several times before update() is only played once, so multi-shot and
+# several ticks in one frame don't stack up identical sounds. Volume is only applied when it changes
+class AudioManager:
+    # How many channels each effect gets, the oldest sound in a group is cut off when all of them are busy
+    CHANNELS = {
+        "laser": 4,
+        "rock_break": 3,
+        "ship_explosion": 1,
+        "powerup": 1,
+    }
+
+    def __init__(self, volume):
+        self.sounds = {name: load_sound(name) for name in self.CHANNELS}
+        self.volume = None
+        self.pending = {}
+        self.played = 0
+        self.merged = 0
+
+        # Reserved channels are never picked by Sound.play, so each group only plays its own effect
+        total = sum(self.CHANNELS.values())
+        if pygame.mixer.get_num_channels() < total:
+            pygame.mixer.set_num_channels(total)
+        pygame.mixer.set_reserved(total)
+
+        # The channels of each group are kept in the order they were last used, oldest first
+        self.channels = {}
+        first = 0
+        for name, count in self.CHANNELS.items():
+            self.channels[name] = [pygame.mixer.Channel(i) for i in range(first, first + count)]
+            first += count
+
+        self.set_volume(volume)
+
+    # Sets the volume from 0 to 10, the sounds are only changed if the volume is different
+    def set_volume(self, volume):
+        if volume == self.volume:
+            return
+        self.volume = volume
+        for sound in self.sounds.values():
+            sound.set_volume(volume / 100 if volume > 0 else 0)
+
+    # Asks for an effect to be played on the next update
+    def play(self, name):
+        if name in self.pending:
+            self.merged += 1
+        self.pending[name] = True
+
+    # Plays the effects asked for since the last update, called once a frame
+    def update(self):
+        for name in self.pending:
+            channels = self.channels[name]
+
+            # Use a quiet channel in the group, or cut off the one that has been playing the longest
+            for channel in channels:
+                if not channel.get_busy():
+                    break
+            else:
+                channel = channels[0]
+            channels.remove(channel)
+            channels.append(channel)
+            channel.play(self.sounds[name])
+            self.played += 1
+        self.pending.clear()
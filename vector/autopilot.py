@@ -0,0 +1,111 @@
+from math import sqrt
+
+from pygame.math import Vector2
+
+from simulation import Controls
+
+
+# Plays the game on its own, for soak tests and for watching the game run without a player.
+# It looks at the simulation after every tick and returns the Controls for the next one, so it flies the ship
+# through the same rotate, accelerate, reverse and shoot calls as the keyboard and its rounds can be recorded.
+# Only the asteroids near the ship are looked at, found with the simulation's asteroid grid.
+# An asteroid about to hit the ship is shot at and backed away from, otherwise the ship aims at the asteroid
+# its bullets can reach the soonest, leading it by where the asteroid will be when the bullet gets there
+class Autopilot:
+
+    # Asteroids further than this from the ship are ignored
+    SCAN_DISTANCE = 350
+
+    # An asteroid is a threat if it will pass within THREAT_MARGIN of the ship's edge in the next THREAT_TICKS,
+    # and the ship moves out of the way if it gets there within DODGE_TICKS
+    THREAT_MARGIN = 30
+    THREAT_TICKS = 60
+    DODGE_TICKS = 25
+
+    # Ticks between shots, and how many degrees off the target the ship can be pointing when it fires
+    FIRE_INTERVAL = 8
+    AIM_TOLERANCE = 4
+
+    def __init__(self):
+        self.cooldown = 0
+
+    # Returns the Controls for the next tick of sim
+    def controls(self, sim):
+        self.cooldown = max(0, self.cooldown - 1)
+        ship = sim.spaceship
+        if not ship:
+            return Controls()
+
+        w, h = sim.size
+        threat = None
+        threat_ticks = self.THREAT_TICKS
+        target = None
+        target_ticks = None
+        for asteroid in sim.asteroids_near(ship.position, self.SCAN_DISTANCE):
+            # Where the asteroid is and how it moves seen from the ship, taking the shortest way around the world
+            offset = Vector2((asteroid.position.x - ship.position.x + w / 2) % w - w / 2,
+                             (asteroid.position.y - ship.position.y + h / 2) % h - h / 2)
+            if offset.length() > self.SCAN_DISTANCE + asteroid.radius:
+                continue
+            velocity = asteroid.velocity - ship.velocity
+
+            # The tick the asteroid comes closest to the ship, and how close that is
+            speed = velocity.length_squared()
+            closest = min(max(-offset.dot(velocity) / speed, 0), self.THREAT_TICKS) if speed else 0
+            if (offset + velocity * closest).length() < ship.radius + asteroid.radius + self.THREAT_MARGIN:
+                if closest < threat_ticks or threat is None:
+                    threat, threat_ticks = asteroid, closest
+
+            # Bullets are removed once they leave the world, so asteroids across its edge can't be hit
+            ticks = self._intercept(offset, velocity, ship.bullet_speed)
+            if ticks is None:
+                continue
+            aim = offset + velocity * ticks
+            if not sim.rect.collidepoint(ship.position + aim):
+                continue
+            if target_ticks is None or ticks < target_ticks:
+                target, target_ticks = aim, ticks
+
+        # A threat is always aimed at, whether or not its bullets can get there in time
+        if threat is not None:
+            offset = Vector2((threat.position.x - ship.position.x + w / 2) % w - w / 2,
+                             (threat.position.y - ship.position.y + h / 2) % h - h / 2)
+            velocity = threat.velocity - ship.velocity
+            ticks = self._intercept(offset, velocity, ship.bullet_speed)
+            target = offset + velocity * ticks if ticks is not None else offset
+
+        # With nothing around, the ship turns on the spot and slows down until something comes into range
+        if target is None:
+            return Controls(1, 0, 0)
+
+        angle = (ship.direction.angle_to(target) + 180) % 360 - 180
+        rotate = 0
+        if abs(angle) > ship.MANEUVERABILITY / 2:
+            rotate = 1 if angle > 0 else -1
+
+        shots = 0
+        if not self.cooldown and abs(angle) <= self.AIM_TOLERANCE:
+            shots = 1
+            self.cooldown = self.FIRE_INTERVAL
+
+        # The ship can only move along the way it points, so it goes whichever way takes it away from the threat
+        thrust = 0
+        if threat is not None and threat_ticks <= self.DODGE_TICKS:
+            thrust = -1 if ship.direction.dot(target) > 0 else 1
+        return Controls(rotate, thrust, shots)
+
+    # Returns how many ticks a bullet fired now at speed takes to hit something at offset moving at velocity,
+    # or None if it never catches up
+    @staticmethod
+    def _intercept(offset, velocity, speed):
+        a = velocity.length_squared() - speed * speed
+        b = 2 * offset.dot(velocity)
+        c = offset.length_squared()
+        if abs(a) < 1e-9:
+            return -c / b if b < 0 else None
+        discriminant = b * b - 4 * a * c
+        if discriminant < 0:
+            return None
+        root = sqrt(discriminant)
+        times = [t for t in ((-b - root) / (2 * a), (-b + root) / (2 * a)) if t >= 0]
+        return min(times) if times else None
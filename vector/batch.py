@@ -0,0 +1,127 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from simulation import Simulation, random_inputs
+
+# Runs many seeded games headless across a pool of processes, e.g. to compare tuning values:
+#   python batch.py --games 1000 --sweep MIN_ASTEROID_DISTANCE=200,300,400 --out results.csv
+# Results are written one line per game as they finish, as CSV or JSON lines depending on the file name
+
+# The simulation owned by each worker process, it is reused for every game the worker plays
+# so sprites and other loaded state stay warm between games
+_simulation = None
+
+
+# Runs once when a worker process starts
+def _init_worker(use_numpy):
+    global _simulation
+    _simulation = Simulation(use_numpy=use_numpy)
+
+
+# Plays one game in a worker process and returns its results
+def play_game(seed, tuning, max_ticks):
+    _simulation.reset(seed, tuning)
+    result = _simulation.run(random_inputs(seed), max_ticks)
+    return {
+        "seed": seed,
+        **tuning,
+        "score": _simulation.score,
+        "ticks": result["ticks"],
+        "survived": _simulation.spaceship is not None,
+        "asteroids_destroyed": _simulation.asteroids_destroyed,
+        "powerups_collected": _simulation.powerups_collected,
+        "seconds": round(result["seconds"], 4),
+    }
+
+
+# Turns "NAME=1,2,3" into ("NAME", [1, 2, 3])
+def _parse_values(text):
+    name, _, values = text.partition("=")
+    return name, [json.loads(value) for value in values.split(",")]
+
+
+# Every (seed, tuning) pair to play, generated lazily so huge batches don't have to fit in memory
+def _jobs(args):
+    tuning = {name: values[0] for name, values in map(_parse_values, args.set)}
+    sweep_name, sweep_values = _parse_values(args.sweep) if args.sweep else (None, [None])
+    for value in sweep_values:
+        job_tuning = dict(tuning, **({sweep_name: value} if sweep_name else {}))
+        for seed in range(args.seed, args.seed + args.games):
+            yield seed, job_tuning
+
+
+# Writes each result as soon as it arrives
+class ResultWriter:
+
+    def __init__(self, file, as_csv):
+        self.file = file
+        self.as_csv = as_csv
+        self.writer = None
+
+    def write(self, row):
+        if self.as_csv:
+            if self.writer is None:
+                self.writer = csv.DictWriter(self.file, fieldnames=list(row))
+                self.writer.writeheader()
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row) + "\n")
+        self.file.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many seeded games of Vector across a process pool")
+    parser.add_argument("--games", type=int, default=100, help="games per tuning value")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--ticks", type=int, default=36000, help="maximum ticks per game")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the CPU count")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a constant of Simulation or Spaceship for every game")
+    parser.add_argument("--sweep", metavar="NAME=V1,V2,...", help="play every seed once with each value")
+    parser.add_argument("--numpy", action="store_true", help="use the numpy entity store")
+    parser.add_argument("--out", default="-", help="a .csv or .jsonl file, - for standard output")
+    args = parser.parse_args()
+
+    # Mistakes in the tuning are reported before any worker is started
+    for text in [*args.set, *([args.sweep] if args.sweep else [])]:
+        try:
+            name, _ = _parse_values(text)
+        except ValueError:
+            parser.error(f"{text} is not NAME=VALUE with JSON values, e.g. MAX_SPEED=8")
+        if not Simulation.is_tunable(name):
+            parser.error(f"unknown tuning parameter {name}, it has to be a constant of Simulation or Spaceship")
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w", newline="")
+    writer = ResultWriter(out, args.out.endswith(".csv"))
+    start = time.perf_counter()
+    games = 0
+
+    workers = args.workers or os.cpu_count()
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(args.numpy,)) as pool:
+        # Only keep a few games per worker queued up, so the pending results stay small however many games are played
+        limit = workers * 4
+        pending = set()
+        for seed, tuning in _jobs(args):
+            if len(pending) >= limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    writer.write(future.result())
+                    games += 1
+            pending.add(pool.submit(play_game, seed, tuning, args.ticks))
+        for future in wait(pending).done:
+            writer.write(future.result())
+            games += 1
+
+    if out is not sys.stdout:
+        out.close()
+    seconds = time.perf_counter() - start
+    print(f"{games} games in {seconds:.1f}s ({games / seconds:.1f} games per second)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from multiprocessing import Pipe
+
+import pygame
+from pygame import Surface
+
+from camera import Camera
+import particles
+from models import GameObject, Spaceship
+from netplay import RemoteSimulation, SnapshotEncoder, TICKED
+from profiler import Profiler
+from render import SpriteBatch
+from simulation import Simulation, Controls
+from soak import soak_headless
+from spatial import SpatialHash
+
+# numpy is optional, the collision check only compares the array backend against the nested loops if it's there
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Benchmarks for the performance sensitive parts of the game, run with "python benchmarks.py [names]".
+# The scenarios play seeded, scripted games in the simulation and can be compared against a saved baseline:
+#   python benchmarks.py --save-baseline baseline.json
+#   python benchmarks.py --baseline baseline.json
+# Baselines are only meaningful on the machine they were saved on
+
+SCREEN_SIZE = (1200, 600)
+
+
+# Creates game objects with random positions, the sprites are blank surfaces so no assets are needed
+def _random_objects(rng, count, radii):
+    objects = []
+    for _ in range(count):
+        radius = rng.choice(radii)
+        position = (rng.uniform(0, SCREEN_SIZE[0]), rng.uniform(0, SCREEN_SIZE[1]))
+        objects.append(GameObject(position, Surface((radius * 2, radius * 2)), (0, 0)))
+    return objects
+
+
+# The original check, every bullet against every asteroid
+def _brute_force_pairs(bullets, asteroids):
+    pairs = []
+    for b, bullet in enumerate(bullets):
+        for a, asteroid in enumerate(asteroids):
+            if asteroid.collides_with(bullet):
+                pairs.append((b, a))
+    return pairs
+
+
+# The same check using the grid as a broad-phase
+def _grid_pairs(bullets, asteroids, grid):
+    index = {id(asteroid): a for a, asteroid in enumerate(asteroids)}
+    grid.rebuild(asteroids)
+    pairs = []
+    for b, bullet in enumerate(bullets):
+        for asteroid in grid.query(bullet.position, bullet.radius):
+            if asteroid.collides_with(bullet):
+                pairs.append((b, index[id(asteroid)]))
+    return pairs
+
+
+# Stands in for the asteroid grid and returns every asteroid for every query, like the original nested loops
+# that checked each bullet against the asteroids list as it was at that moment
+class _EveryAsteroid:
+
+    def __init__(self, sim):
+        self.sim = sim
+
+    def rebuild(self, game_objects):
+        pass
+
+    def query(self, position, radius):
+        return list(self.sim.asteroids)
+
+
+# Plays one tick of bullets sitting inside asteroids, so the pieces of a shot asteroid are hit by the next bullets
+# in the same tick. layout is a list of asteroid positions and the positions of the bullets around them.
+# Returns how many asteroids were destroyed, how many bullets are left and the sizes of the asteroids left
+def _split_pass(layout, seed, use_numpy=False, brute_force=False):
+    sim = Simulation(use_numpy=use_numpy)
+    sim.clear(seed)
+    if brute_force:
+        sim.asteroid_grid = _EveryAsteroid(sim)
+    for position, bullets in layout:
+        sim._create_asteroid(position)
+        for bullet in bullets:
+            sim._create_bullet(bullet, (0, 0))
+    sim.tick()
+    return sim.asteroids_destroyed, len(sim.bullets), sorted(asteroid.size for asteroid in sim.asteroids)
+
+
+# Compares the brute force and grid collision checks for growing numbers of entities, then checks that
+# asteroids split during the collision pass are hit the same way as with the nested loops, with either backend.
+# The second check needs the assets folder, so it has to be run from the same folder as the game
+def bench_collisions(counts=(100, 500, 1000, 2000, 4000), seed=0):
+    rng = random.Random(seed)
+    grid = SpatialHash(SCREEN_SIZE)
+    print(f"{'entities':>9} {'brute ms':>10} {'grid ms':>10} {'speedup':>8} {'hits':>6}")
+    for count in counts:
+        asteroids = _random_objects(rng, count // 2, (12, 24, 48))
+        bullets = _random_objects(rng, count // 2, (3,))
+
+        start = time.perf_counter()
+        brute = _brute_force_pairs(bullets, asteroids)
+        brute_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fast = _grid_pairs(bullets, asteroids, grid)
+        grid_time = time.perf_counter() - start
+
+        # Both checks have to find exactly the same pairs in the same order
+        assert brute == fast
+        print(f"{count:>9} {brute_time * 1000:>10.1f} {grid_time * 1000:>10.1f} "
+              f"{brute_time / grid_time:>7.1f}x {len(fast):>6}")
+
+    layout = []
+    for _ in range(20):
+        x, y = rng.uniform(100, 1100), rng.uniform(100, 500)
+        layout.append(((x, y), [(x + rng.uniform(-10, 10), y + rng.uniform(-10, 10))
+                                for _ in range(rng.randint(1, 7))]))
+    expected = _split_pass(layout, seed, brute_force=True)
+    assert _split_pass(layout, seed) == expected
+    checked = "the grid"
+    if np is not None:
+        assert _split_pass(layout, seed, use_numpy=True) == expected
+        checked = "the grid and the numpy arrays"
+    print(f"split pass: {expected[0]} asteroids destroyed, {checked} match the nested loops")
+
+
+# Measures how long drawing the spaceship takes per frame with and without the pre-rendered rotations.
+# Needs the assets folder, so it has to be run from the same folder as the game
+def bench_ship_draw(frames=2000):
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE, pygame.HIDDEN)
+    ship = Spaceship((600, 300), lambda position, velocity: None)
+
+    for cached in (False, True):
+        Spaceship.USE_ROTATION_CACHE = cached
+        start = time.perf_counter()
+        for frame in range(frames):
+            ship.rotate()
+            ship.draw(screen, 2 if frame % 120 < 60 else 1)
+        per_frame = (time.perf_counter() - start) / frames
+        print(f"rotation cache {'on' if cached else 'off':>3}: {per_frame * 1000:.3f} ms per frame")
+    Spaceship.USE_ROTATION_CACHE = True
+
+
+# Measures a tick of the particle system (moving and drawing every particle) with numpy and without it,
+# explosions are set off until the system is full and then every time enough particles have died
+def bench_particles(ticks=600, seed=0):
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE, pygame.HIDDEN)
+    numpy = particles.np
+    for use_numpy in (True, False):
+        if use_numpy and numpy is None:
+            continue
+        particles.np = numpy if use_numpy else None
+        rng = random.Random(seed)
+        system = particles.ParticleSystem(particles.ParticleSystem.LIMIT, seed)
+        total = 0
+        for _ in range(ticks):
+            while len(system) < system.limit - 160:
+                system.burst("ship_explosion", (rng.uniform(0, SCREEN_SIZE[0]), rng.uniform(0, SCREEN_SIZE[1])))
+            start = time.perf_counter()
+            system.update()
+            system.draw(screen, 0.5)
+            total += time.perf_counter() - start
+        print(f"numpy {'on' if use_numpy else 'off':>3}: {total / ticks * 1000:.3f} ms per tick "
+              f"for {len(system)} particles")
+    particles.np = numpy
+
+
+# Measures the keyframe a client gets when it joins a large world, and checks that snapshots past the limits of
+# the old format (more than 65535 objects, 255 events in a tick or a message of 255 bytes) get through intact
+def bench_snapshots(count=70000, seed=0):
+    sim = Simulation(seed, WORLD_SIZES["large_world"])
+    sim.gen_asteroids(count)
+    sim.message = "Game Over " * 30
+    sim.events = [("rock_break", asteroid.position) for asteroid in list(sim.asteroids)[:300]]
+
+    encoder = SnapshotEncoder()
+    start = time.perf_counter()
+    keyframe = encoder.encode(sim)
+    encoded = time.perf_counter() - start
+    ticked = encoder.encode(sim, TICKED)
+
+    # The keyframe is bigger than the pipe's buffer, so it is sent while the client reads it.
+    # The events come with the next snapshot, a client drops the ones of the keyframe it joins with
+    server, client = Pipe()
+    sender = threading.Thread(target=lambda: (server.send_bytes(keyframe), server.send_bytes(ticked)))
+    sender.start()
+    start = time.perf_counter()
+    remote = RemoteSimulation(conn=client, spectate=True)
+    applied = time.perf_counter() - start
+    client.poll(None)
+    remote.tick(None)
+    sender.join()
+    server.close()
+    client.close()
+
+    assert remote.entity_counts() == sim.entity_counts()
+    assert remote.message == sim.message
+    assert len(remote.events) == len(sim.events)
+    print(f"keyframe of {len(sim.asteroids)} asteroids: {len(keyframe) / 1024:.0f} KB, encoded in {encoded * 1000:.1f} ms, "
+          f"applied in {applied * 1000:.1f} ms")
+
+
+# A short soak of the normal game, which has no leaks, so soak.py must not find any problems in it
+def bench_soak(minutes=1, seed=0):
+    summary = soak_headless(minutes, 5, seed)["summary"]
+    assert not summary["problems"], summary["problems"]
+    drift = summary["frame_drift"]
+    print(f"{summary['rounds']} rounds in {summary['minutes']:.1f} minutes, memory {summary['memory_growth_kb']:+.0f} KB, "
+          f"frame time drift {'unknown' if drift is None else format(drift, '+.1%')}")
+
+
+# Keeps a shield on the ship so scripted scenarios are not cut short by a collision
+def _keep_shield(sim):
+    if sim.spaceship:
+        sim.effects.refresh("shield", sim.ticks, 600)
+
+
+# The normal game, the ship flies around and shoots while the simulation keeps at least 8 asteroids around
+def scenario_steady_state(sim, seed):
+    sim.reset(seed)
+
+    def step(tick):
+        _keep_shield(sim)
+        return Controls(1, 1 if tick % 60 < 20 else 0, int(tick % 10 == 0))
+    return step
+
+
+# Multi-shot stays on and the ship fires three times every tick, which keeps several hundred bullets in the air
+def scenario_bullet_storm(sim, seed):
+    sim.reset(seed)
+
+    def step(tick):
+        _keep_shield(sim)
+        if sim.spaceship:
+            sim.spaceship.bullet_amount = 3
+            sim.effects.refresh("multi", sim.ticks, 200)
+        return Controls(1, 0, 3)
+    return step
+
+
+# Thousands of asteroids at once, spawned the same way the game spawns them
+def scenario_many_asteroids(sim, seed, count=2000):
+    sim.reset(seed)
+    sim.gen_asteroids(count)
+
+    def step(tick):
+        _keep_shield(sim)
+        return Controls(1, 0, int(tick % 5 == 0))
+    return step
+
+
+# Every asteroid is split at once every 20 ticks, large asteroids go through every size before they are gone
+def scenario_split_cascade(sim, seed, count=100):
+    sim.reset(seed)
+
+    def step(tick):
+        _keep_shield(sim)
+        if tick % 20 == 0:
+            if len(sim.asteroids) < count and sim.spaceship:
+                sim.gen_asteroids(count)
+            for asteroid in list(sim.asteroids):
+                sim._remove_asteroid(asteroid)
+                asteroid.split()
+        return Controls()
+    return step
+
+
+# Ten thousand asteroids in a world 100 times the size of the screen, with a camera following the ship
+def scenario_large_world(sim, seed, count=10000):
+    sim.reset(seed)
+    sim.gen_asteroids(count)
+
+    def step(tick):
+        _keep_shield(sim)
+        return Controls(1, 1 if tick % 60 < 30 else 0, int(tick % 10 == 0))
+    return step
+
+
+SCENARIOS = {
+    "steady_state": scenario_steady_state,
+    "bullet_storm": scenario_bullet_storm,
+    "many_asteroids": scenario_many_asteroids,
+    "split_cascade": scenario_split_cascade,
+    "large_world": scenario_large_world,
+}
+
+# Scenarios played in a world bigger than the screen
+WORLD_SIZES = {
+    "large_world": (12000, 6000),
+}
+
+
+# Plays a scenario for a number of ticks, optionally drawing every tick onto an offscreen surface.
+# The ticks keep going after the round ends, so every run does the same amount of work
+def _play(name, ticks, seed, surface, profiler=None):
+    camera = None
+    if name in WORLD_SIZES:
+        camera = Camera(SCREEN_SIZE, WORLD_SIZES[name])
+        sim = Simulation(size=WORLD_SIZES[name], profiler=profiler, active_radius=camera.active_radius())
+    else:
+        sim = Simulation(profiler=profiler)
+    step = SCENARIOS[name](sim, seed)
+    profiler = sim.profiler
+    batch = SpriteBatch()
+    entities = 0
+    for tick in range(ticks):
+        profiler.begin_frame()
+        controls = step(tick)
+        with profiler.section("logic"):
+            sim.tick(controls)
+        if surface is not None:
+            with profiler.section("draw"):
+                if camera is not None:
+                    if sim.spaceship:
+                        camera.follow(sim.spaceship.position)
+                    game_objects = sim.visible_objects(camera)
+                else:
+                    game_objects = sim.game_objects()
+                batch.add(game_objects)
+                batch.draw(surface, 1, 1, camera)
+        profiler.end_frame()
+        entities = max(entities, len(sim.asteroids) + len(sim.bullets) + len(sim.powerups))
+    return sim, entities
+
+
+# Runs a scenario once to time it and once more under tracemalloc to find its peak memory use.
+# Drawing goes to a hidden window, so the sprites are in the screen's pixel format like they are in the game
+def run_scenario(name, ticks=600, seed=0, render=False):
+    surface = pygame.display.set_mode(SCREEN_SIZE, pygame.HIDDEN) if render else None
+
+    profiler = Profiler(enabled=True)
+    profiler.WINDOW = ticks
+    start = time.perf_counter()
+    sim, entities = _play(name, ticks, seed, surface, profiler)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    _play(name, ticks, seed, surface)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    phases = {}
+    for section in profiler.times:
+        if section != "frame":
+            p50, p95, p99 = profiler.percentiles(section)
+            phases[section] = {"p50": round(p50, 4), "p95": round(p95, 4), "p99": round(p99, 4)}
+    return {
+        "ticks": ticks,
+        "ticks_per_second": round(ticks / seconds, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "max_entities": entities,
+        "score": sim.score,
+        "phases": phases,
+        "spawner": sim.spawner.stats(),
+    }
+
+
+def _print_result(name, result, baseline=None):
+    line = (f"{name:<16} {result['ticks_per_second']:>9.0f} ticks/s {result['peak_kb']:>9.0f} KB peak "
+            f"{result['max_entities']:>6} entities")
+    if baseline:
+        change = result["ticks_per_second"] / baseline["ticks_per_second"] - 1
+        line += f"  {change:+.1%} vs baseline"
+    print(line)
+    for section, times in result["phases"].items():
+        print(f"    {section:<16} p50 {times['p50']:.3f}  p95 {times['p95']:.3f}  p99 {times['p99']:.3f} ms")
+    spawner = result.get("spawner")
+    if spawner:
+        print(f"    {'spawner':<16} {spawner['calls']} waves {spawner['spawned']} asteroids "
+              f"avg {spawner['avg_ms']:.3f}  max {spawner['max_ms']:.3f} ms")
+
+
+# Returns the scenarios that got slower than the baseline by more than the tolerance
+def compare(results, baseline, tolerance=0.1):
+    regressions = []
+    for name, result in results.items():
+        if name in baseline:
+            if result["ticks_per_second"] < baseline[name]["ticks_per_second"] * (1 - tolerance):
+                regressions.append(name)
+            if result["score"] != baseline[name]["score"]:
+                print(f"{name}: score changed from {baseline[name]['score']} to {result['score']}, "
+                      f"the scenario no longer plays out the same way")
+    return regressions
+
+
+BENCHMARKS = {
+    "collisions": bench_collisions,
+    "ship_draw": bench_ship_draw,
+    "particles": bench_particles,
+    "snapshots": bench_snapshots,
+    "soak": bench_soak,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Vector, run from the game folder")
+    parser.add_argument("names", nargs="*", help="benchmarks or scenarios to run, all scenarios by default: "
+                        + ", ".join([*SCENARIOS, *BENCHMARKS]))
+    parser.add_argument("--ticks", type=int, default=600, help="ticks per scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--render", action="store_true", help="also draw every tick onto an offscreen surface")
+    parser.add_argument("--baseline", metavar="FILE", help="compare the scenarios against a saved baseline")
+    parser.add_argument("--save-baseline", metavar="FILE", help="save the scenario results as a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="slowdown allowed before failing, 0.1 is 10%%")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = {}
+    for name in args.names or SCENARIOS:
+        if name in BENCHMARKS:
+            BENCHMARKS[name]()
+        else:
+            results[name] = run_scenario(name, args.ticks, args.seed, args.render)
+            _print_result(name, results[name], baseline.get(name))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("slower than the baseline: " + ", ".join(regressions))
+        sys.exit(1)
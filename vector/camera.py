@@ -0,0 +1,41 @@
+from math import hypot
+
+from pygame.math import Vector2
+
+
+# The part of a world bigger than the screen that is shown, centered on the spaceship.
+# The world wraps around, so the view can reach past one edge of the world and show what is on the other side
+class Camera:
+
+    # Extra distance around the view where asteroids are still moved every tick, so anything that can come into
+    # view in the next few ticks is already up to date
+    ACTIVE_MARGIN = 200
+
+    def __init__(self, view_size, world_size):
+        self.view_size = view_size
+        self.world_size = world_size
+        self.left = (world_size[0] - view_size[0]) / 2
+        self.top = (world_size[1] - view_size[1]) / 2
+
+    # Centers the view on a position
+    def follow(self, position):
+        self.left = position[0] - self.view_size[0] / 2
+        self.top = position[1] - self.view_size[1] / 2
+
+    # The distance from the spaceship within which the game has to be simulated at full speed
+    def active_radius(self):
+        return hypot(*self.view_size) / 2 + self.ACTIVE_MARGIN
+
+    # Returns where a position in the world is on the screen. An object is measured from radius to the left
+    # of the view (and above it), so objects partly over the edge of the view are placed on that side
+    def to_screen(self, position, radius=0):
+        x, y = position
+        w, h = self.world_size
+        return Vector2((x - self.left + radius) % w - radius, (y - self.top + radius) % h - radius)
+
+    # Checks if a circle in the world can be seen
+    def sees(self, position, radius):
+        x, y = position
+        w, h = self.world_size
+        return ((x - self.left + radius) % w < self.view_size[0] + radius * 2 and
+                (y - self.top + radius) % h < self.view_size[1] + radius * 2)
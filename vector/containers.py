@@ -0,0 +1,97 @@
+# A list of game objects with stable handles and O(1) removal.
+# Removing an object only marks it, and all the marked objects are dropped together by flush() at the end of a tick.
+# Iterating skips removed objects without copying the list, objects added while iterating are picked up next time
+class EntityList:
+
+    def __init__(self):
+        self.items = []
+        self.removed = {}
+        self.by_handle = {}
+        self.next_handle = 0
+
+    def __len__(self):
+        return len(self.items) - len(self.removed)
+
+    def __iter__(self):
+        items = self.items
+        removed = self.removed
+        for i in range(len(items)):
+            game_object = items[i]
+            if game_object not in removed:
+                yield game_object
+
+    def __contains__(self, game_object):
+        return self.by_handle.get(game_object.handle) is game_object and game_object not in self.removed
+
+    # Adds an object and returns its handle, handles are never reused so an old handle can't find a new object.
+    # Saved objects are put back with the handle they had, next_handle has to be put back along with them
+    def add(self, game_object, handle=None):
+        if handle is None:
+            handle = self.next_handle
+            self.next_handle += 1
+        game_object.handle = handle
+        self.by_handle[handle] = game_object
+        self.items.append(game_object)
+        return handle
+
+    # Returns the object with the given handle, or None if it was removed
+    def get(self, handle):
+        game_object = self.by_handle.get(handle)
+        if game_object is None or game_object in self.removed:
+            return None
+        return game_object
+
+    # Marks an object as removed
+    def remove(self, game_object):
+        self.removed[game_object] = None
+
+    # Drops the removed objects in one pass that keeps the order of the others, and returns them
+    def flush(self):
+        if not self.removed:
+            return []
+        removed = self.removed
+        self.items = [game_object for game_object in self.items if game_object not in removed]
+        for game_object in removed:
+            del self.by_handle[game_object.handle]
+        self.removed = {}
+        return list(removed)
+
+    # Removes everything and returns what was in the list
+    def clear(self):
+        items = [game_object for game_object in self.items if game_object not in self.removed]
+        self.items = []
+        self.removed = {}
+        self.by_handle = {}
+        return items
+
+
+# Tracks how long each active effect (e.g. "shield" or "multi") has left, keyed by name.
+# Effects store the tick they run out on, so starting or refreshing an effect is a single dictionary write
+class EffectTimers:
+
+    def __init__(self):
+        self.ends = {}
+
+    def __contains__(self, name):
+        return name in self.ends
+
+    def __iter__(self):
+        return iter(self.ends)
+
+    # Starts an effect, or restarts it if it is already active, so it lasts for another number of ticks
+    def refresh(self, name, now, ticks):
+        self.ends[name] = now + ticks
+
+    def remove(self, name):
+        self.ends.pop(name, None)
+
+    # Returns how many ticks an effect has left
+    def remaining(self, name, now):
+        return self.ends[name] - now
+
+    # Removes and returns the effects that have run out
+    def expire(self, now):
+        expired = [name for name, end in self.ends.items() if end <= now]
+        for name in expired:
+            del self.ends[name]
+        return expired
@@ -0,0 +1,122 @@
+from pygame.math import Vector2
+
+# numpy is optional, it is only needed when the array backed entity store is turned on
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Keeps the positions, velocities and radii of asteroids and bullets in contiguous arrays (struct of arrays),
+# so moving, wrapping, culling and overlap tests run as one batched operation per tick instead of once per object
+class EntityStore:
+
+    def __init__(self, capacity=256):
+        if np is None:
+            raise ImportError("The array entity backend requires numpy")
+        self.positions = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.radii = np.zeros(capacity)
+
+        # Rows that wrap around the edges of the screen (asteroids) instead of flying off it (bullets)
+        self.wraps = np.zeros(capacity, dtype=bool)
+
+        # Unused rows, popped from the end so the lowest rows are handed out first
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.positions) - len(self.free)
+
+    # Doubles the size of the arrays when every row is in use
+    def _grow(self):
+        capacity = len(self.positions)
+        self.positions = np.concatenate((self.positions, np.zeros((capacity, 2))))
+        self.velocities = np.concatenate((self.velocities, np.zeros((capacity, 2))))
+        self.radii = np.concatenate((self.radii, np.zeros(capacity)))
+        self.wraps = np.concatenate((self.wraps, np.zeros(capacity, dtype=bool)))
+        self.free.extend(range(capacity * 2 - 1, capacity - 1, -1))
+
+    # Reserves a row for a new object and returns its index
+    def add(self, radius=0, wraps=True):
+        if not self.free:
+            self._grow()
+        slot = self.free.pop()
+        self.radii[slot] = radius
+        self.wraps[slot] = wraps
+        return slot
+
+    # Frees a row, a cleared row has no velocity so moving it does nothing
+    def remove(self, slot):
+        self.positions[slot] = 0
+        self.velocities[slot] = 0
+        self.wraps[slot] = False
+        self.free.append(slot)
+
+    # Moves every object by its velocity and wraps the ones that wrap around the screen
+    def move(self, size):
+        self.positions += self.velocities
+        self.positions[self.wraps] %= size
+
+    # Returns which of the given rows are off the screen, positions are truncated like Rect.collidepoint does
+    def outside(self, slots, size):
+        points = np.trunc(self.positions[slots])
+        inside = (points[:, 0] >= 0) & (points[:, 0] < size[0]) & (points[:, 1] >= 0) & (points[:, 1] < size[1])
+        return ~inside
+
+    # Returns which of the given rows can be seen in a view of the world starting at (left, top).
+    # Positions are measured the same way as Camera.sees, so the view can wrap around the edges of the world
+    def inside_view(self, slots, left, top, view_size, world_size):
+        points = self.positions[slots]
+        radii = self.radii[slots]
+        x = (points[:, 0] - left + radii) % world_size[0] < view_size[0] + radii * 2
+        y = (points[:, 1] - top + radii) % world_size[1] < view_size[1] + radii * 2
+        return x & y
+
+    # Returns which of the given rows overlap a circle
+    def overlapping(self, slots, position, radius):
+        delta = self.positions[slots] - position
+        distance = np.sqrt(delta[:, 0] * delta[:, 0] + delta[:, 1] * delta[:, 1])
+        return distance < self.radii[slots] + radius
+
+    # Returns a matrix telling which rows in slots_a overlap which rows in slots_b,
+    # the distance is computed the same way as Vector2.distance_to so the results match collides_with
+    def overlaps(self, slots_a, slots_b):
+        delta = self.positions[slots_a][:, None, :] - self.positions[slots_b][None, :, :]
+        distance = np.sqrt(delta[:, :, 0] * delta[:, :, 0] + delta[:, :, 1] * delta[:, :, 1])
+        return distance < self.radii[slots_a][:, None] + self.radii[slots_b][None, :]
+
+
+# Makes a Vector2 attribute read from and write to a row of an EntityStore array.
+# Objects without a row keep the value on themselves, so the same class works with either backend
+class StoredVector:
+
+    def __init__(self, column):
+        self.column = column
+
+    def __set_name__(self, owner, name):
+        self.local = "_" + name
+
+    def __get__(self, game_object, owner=None):
+        if game_object is None:
+            return self
+        if game_object.slot is None:
+            return getattr(game_object, self.local)
+        return Vector2(getattr(game_object.store, self.column)[game_object.slot].tolist())
+
+    def __set__(self, game_object, value):
+        if game_object.slot is None:
+            setattr(game_object, self.local, value)
+        else:
+            getattr(game_object.store, self.column)[game_object.slot] = tuple(value)
+
+
+# Frees the row of an object and moves its position and velocity back onto the object,
+# so it can still be used after being removed from the game (asteroids split from their last position)
+def detach(game_object):
+    slot = game_object.slot
+    if slot is None:
+        return
+    position, velocity = game_object.position, game_object.velocity
+    game_object.slot = None
+    game_object.position, game_object.velocity = position, velocity
+    game_object.store.remove(slot)
@@ -1,22 +1,62 @@
-import pygame
 import time
-import random
-
-from models import Spaceship, Asteroid, Shield, ShipSpeed, BulletSpeed, MultiShot
-from utils import load_sprite, get_random_position, print_text, load_sound, read_file, score_update, write_file, \
-    write_volume
+from math import atan2, pi
 
+import pygame
 
-# This is the main class that will handle inputs, process game logic, and draw the sprites
+from models import Asteroid, Spaceship
+from assets import AssetLoader
+from audio import AudioManager
+from camera import Camera
+from hud import Hud
+from netplay import RemoteSimulation
+from particles import ParticleSystem
+from profiler import Profiler
+from render import Renderer
+from savestate import Rewind
+from simulation import Simulation, Controls
+from settings import Settings
+from utils import load_sprite, score_update, print_text
+
+
+# This is the main class that will handle inputs, run the simulation, and draw the sprites
 class Vector:
-    # How close asteroids can spawn to your ship
-    MIN_ASTEROID_DISTANCE = 300
-
-    def __init__(self):
-        # Initialize the screen, load the background, and initialize the clock.
+    # Where the profiler trace is saved when F4 is pressed
+    TRACE_FILE = "vector_trace.json"
+    # Frames between updates of the profiler overlay, so the numbers stay readable
+    OVERLAY_INTERVAL = 15
+
+    # The game logic always runs at TICK_RATE ticks a second, frames are drawn as often as MAX_FPS allows
+    # (0 for no limit) and objects are drawn between their positions of the last two ticks.
+    # If drawing is too slow, at most MAX_TICKS_PER_FRAME ticks are run before the next frame and the game slows down
+    TICK_RATE = 60
+    MAX_FPS = 240
+    MAX_TICKS_PER_FRAME = 5
+
+    # How many ticks the result of a round stays on the screen before the next round starts, 4 seconds
+    ROUND_END_TICKS = 240
+
+    # With rewind on, the state of the last REWIND_CAPACITY ticks (10 seconds) is kept, but no more than
+    # REWIND_MEMORY bytes of them, and R winds the game back REWIND_TICKS (3 seconds)
+    REWIND_CAPACITY = 600
+    REWIND_MEMORY = 32 * 1024 * 1024
+    REWIND_TICKS = 180
+
+    # Particles sent out behind the ship every tick it accelerates
+    THRUST_PARTICLES = 3
+
+    # A Vector is one session, it sets up the window, fonts, sounds and settings once and then plays round after round.
+    # recorder saves the player's input for every round.
+    # world_size can be bigger than the screen, then a camera follows the ship around the world.
+    # With a server address the game is played (or only watched with spectate) through a server process.
+    # particles is the most particles that can be on the screen at once, 0 turns them off.
+    # autopilot flies the ship instead of the keyboard, e.g. an Autopilot, it needs the simulation to run locally.
+    # rewind saves the state before every tick so R can wind the game back, it costs time every tick
+    def __init__(self, use_numpy=False, dirty_rects=False, settings=None, profile=False, recorder=None,
+                 world_size=None, tuning=None, server=None, spectate=False, particles=None, autopilot=None,
+                 rewind=False):
+        # Initialize the screen and the clock
         self._init_pygame()
         self.screen = pygame.display.set_mode((1200, 600))
-        self.background = load_sprite("space", False)
         self.clock = pygame.time.Clock()
 
         # A boolean to track if the game is paused
@@ -26,64 +66,273 @@ class Vector:
         self.font_big = pygame.font.Font(None, 64)
         self.font_medium = pygame.font.Font(None, 48)
         self.font_small = pygame.font.Font(None, 32)
-        self.message = ""
-        self.score = 0
-
-        # Open the options file to get the current high scores and sound volume
-        options = read_file("options")
-        # Volume is on the first line, after the text "volume: "
-        self.volume = int(options[0][9:])
-        self.h_scores = []
-        for line in options[1:]:
-            # Scores are displayed on the next 5 lines after the text "score_x = "
-            self.h_scores.append(line[10:-1])
-
-        # Load general game sounds
-        self.ship_explosion = load_sound("ship_explosion")
-        self.rock_break = load_sound("rock_break")
-
-        # Initialize list to hold various types of objects and initialize the spaceship in the center of the screen
-        self.asteroids = []
-        self.bullets = []
-        self.powerups = []
-        self.effects = []
-        self.effect_timers = []
-
-        # self.bullets.append is being passed as a callback function
-        self.spaceship = Spaceship((600, 300), self.bullets.append)
-
-        # The game starts with 6 asteroids on the screen
-        self.gen_asteroids(6)
-
-    # This main loop calls each of the functions to run the game
-    def main_loop(self):
+        self.hud = Hud(self.screen.get_size())
+
+        # Times each part of a frame, F3 turns it on and shows the overlay, F4 saves a trace
+        self.profiler = Profiler(enabled=profile)
+        self.show_profile = profile
+        self.font_profile = None
+
+        # The current high scores and sound volume, the options file is only read if no settings are passed in
+        self.settings = settings if settings is not None else Settings("options")
+        self.recorder = recorder
+
+        # Sprites and sounds are loaded on other threads while a loading screen is shown,
+        # the powerups are only needed once the game is running so they finish loading in the background
+        self.loader = AssetLoader()
+        self._load_assets()
+
+        # With dirty_rects only the parts of the screen that changed are redrawn each frame
+        self.background = load_sprite("space", False)
+        self.renderer = Renderer(self.screen, self.background, dirty_rects)
+
+        # Plays the sound effects of the events reported by the simulation
+        self.audio = AudioManager(self.settings.volume)
+
+        # Debris, explosions and exhaust, they are only drawn and never change the game.
+        # Fewer particles are sent out when frames take too long
+        self.particles = ParticleSystem(particles) if particles != 0 else None
+
+        # The game itself runs in the simulation, by default the world is the size of the screen.
+        # Each round resets the simulation instead of creating a new one.
+        # A server has its own simulation, the world is whatever size the server's is
+        self.spectate = spectate
+        if server is not None:
+            self.sim = RemoteSimulation(server, spectate)
+            world_size = self.sim.size
+        screen_size = self.screen.get_size()
+        world_size = tuple(world_size) if world_size else screen_size
+        self.camera = None
+        active_radius = None
+        if world_size != screen_size:
+            self.camera = Camera(screen_size, world_size)
+            active_radius = self.camera.active_radius()
+        if server is None:
+            self.sim = Simulation(None, world_size, use_numpy, tuning, self.profiler, active_radius)
+
+        # replay is an iterator of Controls played instead of the keyboard,
+        # round_end counts down the frames left to show the end of the round, it is None while the round is played
+        self.replay = None
+        self.round_end = None
+        self.rounds_played = 0
+        self.autopilot = autopilot
+
+        # Shots fired in frames that had no tick, they are fired on the next tick
+        self.pending_shots = 0
+
+        # A state is saved before every tick so the game can be wound back. Not while recording,
+        # the recording would no longer play out the same way, and not when the game runs on a server.
+        # Saving a large world every tick is too slow to keep up, so rewind is never on there
+        self.rewind = None
+        if rewind and recorder is None and server is None and self.camera is None:
+            self.rewind = Rewind(self.REWIND_CAPACITY, self.REWIND_MEMORY)
+
+    # This main loop calls each of the functions to run the game.
+    # A recording is a list of RecordedRounds to replay instead of playing new rounds,
+    # rounds limits how many rounds are played, by default the game runs until the window is closed.
+    # monitor is called after every frame with how long the last frame took, the session ends when it returns False
+    def main_loop(self, recording=None, rounds=None, monitor=None):
+        recorded_rounds = iter(recording) if recording is not None else None
+        try:
+            if not self._start_round(recorded_rounds):
+                return
+        except EOFError:
+            return
+
+        profiler = self.profiler
+        tick_time = 1 / self.TICK_RATE
+        accumulator = 0
+        last_frame = time.perf_counter()
         while True:
-            self._handle_input()
-            self._process_game_logic()
-            self._draw()
+            profiler.begin_frame()
+            with profiler.section("input"):
+                controls = self._handle_input()
+
+            # Add up the time since the last frame and run a tick for every TICK_RATE'th of a second that has passed.
+            # Nothing moves while the game is paused
+            now = time.perf_counter()
+            frame_time = now - last_frame
+            accumulator += frame_time
+            if self.particles is not None:
+                self.particles.adapt(frame_time)
+            last_frame = now
+            if self.paused:
+                accumulator = 0
+                self.pending_shots = 0
+            else:
+                self.pending_shots += controls.shots
 
-            # If the game is over or the player has won, wait a few seconds and then restart the game
-            if not self.spaceship or (self.spaceship and not self.asteroids):
-                time.sleep(4)
-                break
+            ticks = 0
+            while accumulator >= tick_time:
+                # Drop the time that can't be caught up on, instead of falling further and further behind
+                if ticks == self.MAX_TICKS_PER_FRAME:
+                    accumulator = 0
+                    break
+                accumulator -= tick_time
+                ticks += 1
+
+                # A server closes the connection when its game is over, e.g. when the player of a watched game quits
+                try:
+                    if not self._tick(controls, recorded_rounds, rounds):
+                        return
+                except EOFError:
+                    return
+
+            # Sounds asked for during this frame's ticks are played together
+            self.audio.update()
+
+            # Pick up any assets that finished loading in the background
+            if not self.loader.finished():
+                self.loader.poll()
+
+            # How far the game is between the last tick and the next one, objects are drawn that far along
+            alpha = 1 if self.paused or self.round_end is not None else accumulator / tick_time
+            self._draw(alpha)
+            profiler.end_frame(self.sim.entity_counts() if profiler.enabled else None)
+            if monitor is not None and not monitor(frame_time):
+                return
+
+    # Runs one tick of the game with the keys that are held down, and any shots fired since the last tick.
+    # Returns False when the session is over
+    def _tick(self, controls, recorded_rounds, rounds):
+        profiler = self.profiler
+
+        # No logic is processed once the round is over, the scores stay on the screen for a few seconds
+        # while the game keeps drawing and handling input, then the next round starts
+        if self.round_end is not None:
+            self._update_particles()
+            self.round_end -= 1
+            if self.round_end <= 0:
+                # A watched game's next round starts whenever its player starts it. Until then the end of the round
+                # stays on the screen and the snapshots are checked every tick, so the window keeps going
+                if self.spectate:
+                    self.round_end = 0
+                    self.sim.tick(controls)
+                    if self.sim.game_over:
+                        return True
+                if rounds is not None and self.rounds_played >= rounds:
+                    return False
+                return self._start_round(recorded_rounds)
+            return True
+
+        # A replay or the autopilot ignores the keyboard, apart from quitting and pausing,
+        # and a replayed round ends with the recording
+        if self.replay is not None:
+            controls = next(self.replay, None)
+        else:
+            if self.autopilot is not None:
+                controls = self.autopilot.controls(self.sim)
+            else:
+                controls = Controls(controls.rotate, controls.thrust, self.pending_shots)
+            self.pending_shots = 0
+            if self.recorder:
+                self.recorder.record(controls)
+
+        if controls is not None:
+            if self.rewind is not None and self.replay is None:
+                with profiler.section("save"):
+                    self.rewind.record(self.sim)
+            with profiler.section("logic"):
+                self.sim.tick(controls)
+            with profiler.section("events"):
+                self._handle_events(self.sim.events)
+            self._update_particles(controls)
+        if controls is None or self.sim.game_over:
+            self._end_round()
+        return True
+
+    # Resets the simulation for a new round, or for the next round of a recording.
+    # Returns False if the recording has no rounds left
+    def _start_round(self, recorded_rounds=None):
+        if recorded_rounds is None:
+            self.sim.reset()
+            self.replay = None
+        else:
+            recorded = next(recorded_rounds, None)
+            if recorded is None:
+                return False
+            # The world has to be set up the same way as when the round was played, or it plays out differently
+            if tuple(recorded.size) != tuple(self.sim.size):
+                raise ValueError(f"the recording was played in a {recorded.size[0]}x{recorded.size[1]} world, "
+                                 f"start the replay with the same --world")
+            if recorded.active_radius != self.sim.active_radius:
+                raise ValueError("the recording moved the asteroids far from the ship differently than this game, "
+                                 "e.g. it was played through a server, play it back with replay.py")
+            self.sim.reset(recorded.seed, recorded.tuning)
+            self.replay = recorded.controls()
+
+        self.round_end = None
+        self.paused = False
+        self.pending_shots = 0
+        if self.rewind is not None:
+            self.rewind.clear()
+        if self.particles is not None:
+            self.particles.clear()
+        if self.recorder and self.replay is None:
+            self.recorder.start_round(self.sim.seed, self.sim.size, self.sim.active_radius, self.sim.tuning)
+        return True
+
+    # Starts showing the end of the round and saves the round's recording
+    def _end_round(self):
+        self.round_end = self.ROUND_END_TICKS
+        self.rounds_played += 1
+        if self.recorder:
+            self.recorder.end_round()
+
+    # Shows a progress bar until the assets needed to start the game are loaded, the window keeps responding meanwhile
+    def _load_assets(self):
+        step = Spaceship.MANEUVERABILITY
+        self.loader.load({"asteroid": Asteroid.SIZE_TO_SCALE.values()}, {"spaceship": step, "spaceship_shielded": step},
+                         lazy=("powerup_",))
+
+        w, h = self.screen.get_size()
+        bar = pygame.Rect(w / 4, h / 2 + 40, w / 2, 20)
+        while self.loader.poll():
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (
+                        event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    self.loader.shutdown()
+                    self._quit()
+
+            self.screen.fill("black")
+            print_text(self.screen, "Loading...", self.font_medium, "center", "ghostwhite")
+            pygame.draw.rect(self.screen, "ghostwhite", bar, 2)
+            filled = bar.inflate(-8, -8)
+            filled.w = round(filled.w * self.loader.progress())
+            pygame.draw.rect(self.screen, "ghostwhite", filled)
+            pygame.display.flip()
+            self.clock.tick(30)
+
+    # Saves anything that hasn't been written yet and closes the game
+    def _quit(self):
+        self.settings.flush()
+        if self.recorder:
+            self.recorder.end_round()
+        quit()
 
     def _init_pygame(self):
         pygame.init()
         pygame.display.set_caption("Vector")
 
+    # Reads the keyboard and returns the Controls for the next tick
     def _handle_input(self):
+        shots = 0
 
         # Quit the game if escape or the x is pressed
         for event in pygame.event.get():
             if event.type == pygame.QUIT or (
                     event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
-                quit()
+                self._quit()
+
+            # Redraw the whole screen if the window was covered up or restored
+            elif event.type == pygame.VIDEOEXPOSE:
+                self.renderer.invalidate()
 
             # Fire bullets if space is pressed
             elif (
-                self.spaceship and event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE
+                event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE
             ):
-                self.spaceship.shoot(self.volume)
+                shots += 1
 
             # If the P key is pressed pause or unpause the game
             elif (
@@ -91,230 +340,155 @@ class Vector:
             ):
                 self.paused = not self.paused
 
+            # R winds the game back a few seconds, while the round is still being played
+            elif (
+                event.type == pygame.KEYDOWN and event.key == pygame.K_r
+            ):
+                if self.rewind is not None and self.replay is None and self.round_end is None:
+                    self.rewind.rewind(self.sim, self.REWIND_TICKS)
+                    self.pending_shots = 0
+
+            # F3 turns the profiler and its overlay on or off, F4 saves what it recorded as a trace file
+            elif (
+                event.type == pygame.KEYDOWN and event.key == pygame.K_F3
+            ):
+                self.show_profile = not self.show_profile
+                self.profiler.enabled = self.show_profile
+                if self.show_profile:
+                    self.profiler.reset()
+            elif (
+                event.type == pygame.KEYDOWN and event.key == pygame.K_F4
+            ):
+                if self.profiler.frames:
+                    self.profiler.dump_trace(self.TRACE_FILE)
+
             # If the game is paused the player can use the arrow keys to adjust the volume
             elif (
                 self.paused and event.type == pygame.KEYDOWN and event.key == pygame.K_UP
             ):
-                if self.volume < 10:
-                    self.volume += 1
-                    write_volume(self.volume)
+                if self.settings.volume < 10:
+                    self.settings.volume += 1
+                    self.audio.set_volume(self.settings.volume)
             elif (
                 self.paused and event.type == pygame.KEYDOWN and event.key == pygame.K_DOWN
             ):
-                if self.volume > 0:
-                    self.volume -= 1
-                    write_volume(self.volume)
+                if self.settings.volume > 0:
+                    self.settings.volume -= 1
+                    self.audio.set_volume(self.settings.volume)
 
         is_key_pressed = pygame.key.get_pressed()
 
         # Turn the ship if right or left is pressed, accelerate if up, reverse if down, decelerate if nothing is pressed
-        if self.spaceship:
-            if is_key_pressed[pygame.K_RIGHT]:
-                self.spaceship.rotate(clockwise=True)
-            elif is_key_pressed[pygame.K_LEFT]:
-                self.spaceship.rotate(clockwise=False)
-            if is_key_pressed[pygame.K_UP]:
-                self.spaceship.accelerate()
-            elif is_key_pressed[pygame.K_DOWN]:
-                self.spaceship.reverse()
-            else:
-                self.spaceship.decelerate()
-
-    # Returns a list of objects in the game
-    def _get_game_objects(self):
-        game_objects = [*self.asteroids, *self.bullets, *self.powerups]
-
-        if self.spaceship:
-            game_objects.append(self.spaceship)
-        return game_objects
-
-    # Main logic is processed here every frame
-    def _process_game_logic(self):
-        # No logic is processed if the game is paused
-        if not self.paused:
-
-            # Move current game objects
-            for game_object in self._get_game_objects():
-                game_object.move(self.screen)
-
-            # Game ends if ship hits an asteroid
-            if self.spaceship:
-                for asteroid in self.asteroids[:]:
-                    if asteroid.collides_with(self.spaceship):
-
-                        # Check to see if the player has a shield, if yer, remove it and provide points
-                        if "shield" in self.effects:
-                            del self.effect_timers[self.effects.index("shield")]
-                            self.effects.remove("shield")
-                            self.asteroids.remove(asteroid)
-                            key = {3: 700, 2: 300, 1: 100}
-                            self.score += key[asteroid.size]
-
-                        # If there is no shield, display lose message, update scores, and end the function
-                        else:
-                            self.spaceship = None
-                            self.message = "You Lost!"
-                            self.ship_explosion.play()
-                            self.h_scores = score_update(self.h_scores, self.score)
-                            write_file("options", self.h_scores)
-                            break
-
-            # Applies different powerups when the ship touches them
-            if self.spaceship:
-                for powerup in self.powerups[:]:
-                    if powerup.collides_with(self.spaceship):
-                        powerup.pickup_sound(self.volume)
-                        if type(powerup) == Shield:
-                            if "shield" in self.powerups:
-                                self.effect_timers[self.effects.index("shield")] = 600
-
-                            # If the player already has a shield, extend its duration
-                            else:
-                                self.effects.append("shield")
-                                self.effect_timers.append(600)
-                        elif type(powerup) == ShipSpeed:
-                            self.spaceship.acceleration += .1
-                        elif type(powerup) == BulletSpeed:
-                            self.spaceship.bullet_speed += .5
-                        elif type(powerup) == MultiShot:
-                            if "multi" in self.powerups:
-                                self.effect_timers[self.effects.index("multi")] = 200
-                            else:
-                                self.spaceship.bullet_amount = 3
-                                self.effects.append("multi")
-                                self.effect_timers.append(200)
-
-                        # Once picked up, remove the powerup from the screen
-                        self.powerups.remove(powerup)
-
-            # Limit max bullet speed
-            if self.spaceship.bullet_speed > 6:
-                self.spaceship.bullet_speed = 6
-
-            # Handles asteroids splitting if hit with a bullet
-            for bullet in self.bullets[:]:
-                for asteroid in self.asteroids[:]:
-                    if asteroid.collides_with(bullet):
-                        self.asteroids.remove(asteroid)
-                        self.bullets.remove(bullet)
-                        self.rock_break.play()
-                        asteroid.split()
-                        if self.spaceship:
-                            self.score += 100
-
-                        # Chance to randomly generate a powerup when an asteroid is hit
-                        chance = random.randint(1, 10)
-                        if chance <= 1:
-                            chance = random.randint(1, 4)
-                            if chance == 1:
-                                self.powerups.append(MultiShot(bullet.position))
-                            elif chance == 2:
-                                self.powerups.append(ShipSpeed(bullet.position))
-                            elif chance == 3:
-                                self.powerups.append(BulletSpeed(bullet.position))
-                            else:
-                                self.powerups.append(Shield(bullet.position))
-                        break
-
-            # Remove bullets that have left the screen
-            for bullet in self.bullets[:]:
-                if not self.screen.get_rect().collidepoint(bullet.position):
-                    self.bullets.remove(bullet)
-
-            # If the player manages to destroy all asteroid, they win.
-            # This is legacy code from before the game generated new asteroids over time
-            # This could be removed, or changed to trigger a win state when a certain score is triggered
-            if not self.asteroids and self.spaceship:
-                self.message = "You Won!"
-                self.h_scores = score_update(self.h_scores, self.score)
-                write_file("options", self.h_scores)
-
-            # Updates game volume
-            if self.volume > 0:
-                self.ship_explosion.set_volume(self.volume / 100)
-                self.rock_break.set_volume(self.volume / 100)
+        rotate = thrust = 0
+        if is_key_pressed[pygame.K_RIGHT]:
+            rotate = 1
+        elif is_key_pressed[pygame.K_LEFT]:
+            rotate = -1
+        if is_key_pressed[pygame.K_UP]:
+            thrust = 1
+        elif is_key_pressed[pygame.K_DOWN]:
+            thrust = -1
+        return Controls(rotate, thrust, shots)
+
+    # Plays sounds and sends out particles for what happened during the last tick
+    # and saves the high scores when the round ends
+    def _handle_events(self, events):
+        for name, position in events:
+            # Replays, watched games and the autopilot's games don't count towards the high scores
+            if name == "game_over":
+                if self.replay is None and not self.spectate and self.autopilot is None:
+                    self.settings.high_scores = score_update(self.settings.high_scores, self.sim.score)
             else:
-                self.ship_explosion.set_volume(0)
-                self.rock_break.set_volume(0)
-
-            # Decrease the time remaining on powerups and remove them if time is up
-            for x in range(len(self.effects)):
-                x -= 1
-                count = self.effect_timers[x]
-                if count > 0:
-                    self.effect_timers[x] -= 1
-                elif count == 0:
-                    if self.effects[x] is "multi":
-                        self.spaceship.bullet_amount = 1
-                    del self.effects[x]
-                    del self.effect_timers[x]
-
-            # Generate new asteroids if there are less than 8 on the screen
-            if len(self.asteroids) < 8:
-                self.gen_asteroids(3)
-
-    # Draws all objects
-    def _draw(self):
-
-        # Different objects display if the game is paused
-        if not self.paused:
-            # Draw the background and all current game objects
-            self.screen.blit(self.background, (0, 0))
-            for game_object in self._get_game_objects():
-
-                # An alternate sprite is displayed for the spaceship if it has a shield
-                if type(Spaceship):
-                    if "shield" in self.effects:
-                        game_object.draw(self.screen, 2)
-                    else:
-                        game_object.draw(self.screen, 1)
-                else:
-                    game_object.draw(self.screen, 1)
-
-            # If a message exists, draw it (Used for win and lose messages)
-            if self.message:
-                print_text(self.screen, self.message, self.font_big, "center")
-
-            # Display the score at the top of the screen
-            print_text(self.screen, "Score: " + str(self.score), self.font_small, "top", "ghostwhite")
-
-            # If the game is over, display the high scores
-            if not self.spaceship or (self.spaceship and not self.asteroids):
-                print_text(self.screen, "Highscores:", self.font_medium, "scoreboard", "ghostwhite")
-                for x in range(5):
-                    print_text(self.screen, (str(x+1) + ": " + str(self.h_scores[x])),
-                               self.font_small, ("score_" + str(x+1)), "ghostwhite")
-
-            # Move the clock forward
-            pygame.display.flip()
-            self.clock.tick(60)
-
-        # Draw these if the game is paused
+                self.audio.play(name)
+                if self.particles is not None:
+                    self.particles.burst(name, position)
+
+    # Moves the particles one tick and adds the exhaust of the ship if it is accelerating.
+    # A watched game doesn't know which keys its player holds, so it has no exhaust
+    def _update_particles(self, controls=None):
+        particles = self.particles
+        if particles is None:
+            return
+        with self.profiler.section("particles"):
+            particles.update()
+            ship = self.sim.spaceship
+            if ship and controls is not None and controls.thrust > 0 and not self.spectate:
+                angle = atan2(ship.direction.y, ship.direction.x) + pi
+                particles.emit("thrust", ship.position - ship.direction * ship.radius, self.THRUST_PARTICLES,
+                               angle, 0.6, ship.velocity)
+
+    # Draws all objects, alpha is how far the game is between the last tick and the next one
+    def _draw(self, alpha=1):
+        # Game objects are hidden while the game is paused.
+        # In a large world only the objects the camera can see are drawn
+        camera = self.camera
+        if self.paused:
+            game_objects = []
+        elif camera:
+            if self.sim.spaceship:
+                camera.follow(self.sim.spaceship.interpolate(alpha))
+            game_objects = self.sim.visible_objects(camera)
         else:
-            self.screen.blit(self.background, (0, 0))
-            print_text(self.screen, "Paused", self.font_big, "center", "darkblue")
-            print_text(self.screen, "Score: " + str(self.score), self.font_small, "top", "ghostwhite")
-            print_text(self.screen, "Highscores:", self.font_medium, "scoreboard", "ghostwhite")
-            for x in range(5):
-                print_text(self.screen, (str(x + 1) + ": " + str(self.h_scores[x])), self.font_small,
-                           ("score_" + str(x + 1)), "ghostwhite")
-
-            # Display the volume so that it can be changed by the player
-            print_text(self.screen, "Volume: " + str(self.volume), self.font_small, "volume", "ghostwhite")
-
-            pygame.display.flip()
-            self.clock.tick(60)
-
-    # A helper function to regenerate random asteroid positions
-    # until they are far enough away from the ship to be spawned
-    def gen_asteroids(self, num):
-        for _ in range(num):
-            while True:
-                position = get_random_position(self.screen)
-                if (
-                        position.distance_to(self.spaceship.position) >
-                        self.MIN_ASTEROID_DISTANCE
-                ):
-                    break
+            game_objects = self.sim.game_objects()
+
+        # An alternate sprite is displayed for the spaceship if it has a shield
+        s_type = 2 if "shield" in self.sim.effects else 1
+
+        profiler = self.profiler
+        with profiler.section("hud"):
+            self._update_hud()
+        with profiler.section("render"):
+            self.renderer.render(game_objects, s_type, self.hud, alpha, camera,
+                                 None if self.paused else self.particles)
+
+        # Wait if frames are being drawn faster than MAX_FPS
+        with profiler.section("wait"):
+            self.clock.tick(self.MAX_FPS)
+
+    # Decides which text is on the screen, the HUD only renders text again when it changes
+    def _update_hud(self):
+        # The message in the center is used for pausing, winning and losing
+        if self.paused:
+            self.hud.show("message", "Paused", self.font_big, "center", "darkblue")
+        elif self.sim.message:
+            self.hud.show("message", self.sim.message, self.font_big, "center")
+        else:
+            self.hud.hide("message")
+
+        # Display the score at the top of the screen
+        self.hud.show("score", "Score: " + str(self.sim.score), self.font_small, "top", "ghostwhite")
+
+        # Display the high scores if the game is paused or over
+        if self.paused or self.round_end is not None:
+            self.hud.show("scoreboard", "Highscores:", self.font_medium, "scoreboard", "ghostwhite")
+            h_scores = self.settings.high_scores
+            for x in range(1, 6):
+                self.hud.show("score_" + str(x), str(x) + ": " + str(h_scores[x - 1]), self.font_small,
+                              "score_" + str(x), "ghostwhite")
+        else:
+            self.hud.hide("scoreboard")
+            for x in range(1, 6):
+                self.hud.hide("score_" + str(x))
 
-            self.asteroids.append(Asteroid(position, self.asteroids.append))
+        # Display the volume while paused so that it can be changed by the player
+        if self.paused:
+            self.hud.show("volume", "Volume: " + str(self.settings.volume), self.font_small, "volume", "ghostwhite")
+        else:
+            self.hud.hide("volume")
+
+        self._update_profile_overlay()
+
+    # Shows the profiler's timings in the top left corner, only updating them every few frames
+    def _update_profile_overlay(self):
+        if not self.show_profile:
+            for name in self.hud.elements:
+                if name[:8] == "profile_":
+                    self.hud.hide(name)
+            return
+
+        if self.profiler.frames % self.OVERLAY_INTERVAL:
+            return
+        if self.font_profile is None:
+            self.font_profile = pygame.font.SysFont("monospace", 14)
+        for x, line in enumerate(self.profiler.report()):
+            self.hud.show("profile_" + str(x), line, self.font_profile, "profile_" + str(x), "ghostwhite")
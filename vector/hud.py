@@ -0,0 +1,139 @@
+from collections import OrderedDict
+
+from pygame import Color
+from pygame.display import get_surface
+
+
+# Keeps rendered text surfaces keyed by (text, font, color), so text that has not changed is not rasterized again.
+# When the cache is full the least recently used surface is dropped
+class TextCache:
+
+    def __init__(self, capacity=128):
+        self.capacity = capacity
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, font, color):
+        # pygame colors can't be used as keys, so they are turned into (r, g, b, a) tuples
+        key = (text, font, tuple(Color(color)))
+        text_surface = self.surfaces.get(key)
+        if text_surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return text_surface
+
+        self.misses += 1
+        text_surface = font.render(text, True, color)
+
+        # Text is drawn every frame, so it is kept in the screen's pixel format once there is a screen
+        if get_surface() is not None:
+            text_surface = text_surface.convert_alpha()
+        self.surfaces[key] = text_surface
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)
+        return text_surface
+
+
+# Shared by print_text and the HUD
+text_cache = TextCache()
+
+# The centers of the preset text positions, computed once for each screen size
+_anchors = {}
+
+
+# Returns the preset text positions for a screen size
+def get_anchors(size):
+    anchors = _anchors.get(size)
+    if anchors is None:
+        w, h = size
+        anchors = {
+            "center": (w / 2, h / 2),
+            "top": (w / 2, 20),
+            "scoreboard": (w / 2, h / 2 + 50),
+            "volume": (w / 2, 50),
+        }
+        # Positions of the 5 high scores below the scoreboard title
+        for x in range(1, 6):
+            anchors["score_" + str(x)] = (w / 2, h / 2 + 60 + 20 * x)
+        _anchors[size] = anchors
+    return anchors
+
+
+# Returns the rect a text surface should be drawn at for one of the preset positions
+def place_text(text_surface, position, size):
+    anchors = get_anchors(size)
+    if position not in anchors and position[:6] == "score_":
+        x = int(position[6:])
+        anchors[position] = (size[0] / 2, size[1] / 2 + 60 + 20 * x)
+
+    rect = text_surface.get_rect()
+    if position in anchors:
+        rect.center = anchors[position]
+    # Lines of the profiler overlay are lined up on the left of the screen
+    elif position[:8] == "profile_":
+        rect.topleft = (10, 10 + 16 * int(position[8:]))
+    return rect
+
+
+# A single piece of text on the HUD
+class HudElement:
+
+    def __init__(self):
+        self.value = None
+        self.surface = None
+        self.rect = None
+        self.visible = False
+
+
+# Holds the text drawn on top of the game (score, messages, high scores and volume).
+# An element is only rendered again when its text, font or color changes, and the areas that changed
+# since the last call to dirty_rects are tracked so they can be redrawn on their own
+class Hud:
+
+    def __init__(self, size):
+        self.size = size
+        self.elements = {}
+        self.dirty = []
+
+    # Shows an element, rendering it again only if something about it changed
+    def show(self, name, text, font, position, color=Color("tomato")):
+        element = self.elements.get(name)
+        if element is None:
+            element = self.elements[name] = HudElement()
+
+        value = (text, font, position, tuple(Color(color)))
+        if element.visible and element.value == value:
+            return
+
+        if element.visible:
+            self.dirty.append(element.rect)
+        element.value = value
+        element.surface = text_cache.render(text, font, color)
+        element.rect = place_text(element.surface, position, self.size)
+        element.visible = True
+        self.dirty.append(element.rect)
+
+    # Hides an element, elements keep their drawing order when they are shown again
+    def hide(self, name):
+        element = self.elements.get(name)
+        if element is None:
+            self.elements[name] = HudElement()
+        elif element.visible:
+            element.visible = False
+            self.dirty.append(element.rect)
+
+    # Draws every visible element in one go
+    def draw(self, surface):
+        surface.blits([(element.surface, element.rect) for element in self.elements.values() if element.visible],
+                      False)
+
+    # Returns the areas covered by visible elements
+    def rects(self):
+        return [element.rect for element in self.elements.values() if element.visible]
+
+    # Returns the areas of the screen where the HUD changed since the last call
+    def dirty_rects(self):
+        rects = self.dirty
+        self.dirty = []
+        return rects
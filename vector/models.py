@@ -1,14 +1,24 @@
+import random
+
 from pygame.math import Vector2
 from pygame.transform import rotozoom
 
-from utils import load_sprite, wrap_position, get_random_velocity, load_sound, approach_zero
+from utils import load_sprite, wrap_position, get_random_velocity, approach_zero, load_rotations
+from entities import StoredVector
 
 # Create a Vector2 to track the direction UP
 UP = Vector2(0, -1)
 
 
-# A class for game objects to inherit from
+# A class for game objects to inherit from.
+# Game objects use __slots__ since there can be a lot of them and they are reused by the pools.
+# handle is given to the object by the EntityList it is added to
 class GameObject:
+    __slots__ = ("position", "sprite", "radius", "velocity", "handle")
+
+    # Objects that are always drawn with their own sprite can be drawn together by render.SpriteBatch
+    BATCHED = True
+
     def __init__(self, position, sprite, velocity):
         self.position = Vector2(position)
         self.sprite = sprite
@@ -17,14 +27,29 @@ class GameObject:
         # To keep track of speed and direction
         self.velocity = Vector2(velocity)
 
-    # Draws the object based on its size and the size of the screen
-    def draw(self, surface, s_type):
-        blit_position = self.position - Vector2(self.radius)
-        surface.blit(self.sprite, blit_position)
-
-    # Make objects that leave the screen re-appear on the opposite side
-    def move(self, surface):
-        self.position = wrap_position(self.position + self.velocity, surface)
+    # Draws the object based on its size and the size of the screen, returns the area that was drawn to.
+    # With a camera the object is drawn where it is in the camera's view of the world
+    def draw(self, surface, s_type, alpha=1, camera=None):
+        blit_position = self.screen_position(alpha, camera) - Vector2(self.radius)
+        return surface.blit(self.sprite, blit_position)
+
+    def screen_position(self, alpha, camera):
+        position = self.interpolate(alpha)
+        if camera is not None:
+            return camera.to_screen(position, self.radius)
+        return position
+
+    # Where the object is when the game is alpha of the way from the last tick to the next one.
+    # Objects moved by their velocity during the last tick, so stepping back from the current position
+    # never jumps across the screen when the object wrapped around
+    def interpolate(self, alpha):
+        if alpha >= 1:
+            return self.position
+        return self.position - self.velocity * (1 - alpha)
+
+    # Make objects that leave the world re-appear on the opposite side
+    def move(self, size):
+        self.position = wrap_position(self.position + self.velocity, size)
 
     # Checks if object has collided with another game object
     def collides_with(self, other_obj):
@@ -38,6 +63,15 @@ class Spaceship(GameObject):
     MANEUVERABILITY = 3
     MAX_SPEED = 6
 
+    # Draw from the pre-rendered rotations instead of rotating the sprite every frame
+    USE_ROTATION_CACHE = True
+
+    # The sprite depends on the direction and shield, so the ship draws itself
+    BATCHED = False
+
+    __slots__ = ("acceleration", "bullet_speed", "bullet_amount", "create_bullet_callback", "sprite_shield",
+                 "rotations", "direction")
+
     def __init__(self, position, create_bullet_callback):
 
         # Set default values that can be changed through powerups
@@ -45,13 +79,17 @@ class Spaceship(GameObject):
         self.bullet_speed = 3
         self.bullet_amount = 1
 
-        # Allows you to pass bullet objects back to the game.py file
+        # Called with the position and velocity of every bullet fired, the game creates and keeps track of them
         self.create_bullet_callback = create_bullet_callback
 
-        # Setup sound for firing a bullet
-        self.laser_sound = load_sound("laser")
         self.sprite_shield = load_sprite("spaceship_shielded")
 
+        # The ship can only turn in steps of MANEUVERABILITY degrees, so every angle it can face is rendered up front
+        self.rotations = {
+            1: load_rotations("spaceship", self.MANEUVERABILITY),
+            2: load_rotations("spaceship_shielded", self.MANEUVERABILITY),
+        }
+
         self.direction = Vector2(UP)
         super().__init__(position, load_sprite("spaceship"), Vector2(0))
 
@@ -75,7 +113,7 @@ class Spaceship(GameObject):
         # Use a helper function to stop deceleration when speed hits 0
         x = approach_zero(x, deceleration)
         y = approach_zero(y, deceleration)
-        self.velocity = (x, y)
+        self.velocity = Vector2(x, y)
 
     # Allows the ship to move backwards
     def reverse(self):
@@ -84,35 +122,32 @@ class Spaceship(GameObject):
             self.velocity -= self.direction * self.acceleration
 
     # Fires a bullet from the ship
-    def shoot(self, volume):
+    def shoot(self):
 
-        # Calculate the bullet velocity, create a bullet object, and pass it back with the callback function
+        # Calculate the bullet velocity and pass it back with the callback function to create the bullet
         bullet_velocity = self.direction * self.bullet_speed + self.velocity
-        bullet = Bullet(self.position, bullet_velocity)
-        self.create_bullet_callback(bullet)
+        self.create_bullet_callback(self.position, bullet_velocity)
 
         # Create two more bullets if multi-shot is active
         if self.bullet_amount == 3:
             dir1 = self.direction.rotate(self.MANEUVERABILITY * 3)
             bullet_velocity = dir1 * self.bullet_speed + self.velocity
-            bullet = Bullet(self.position, bullet_velocity)
-            self.create_bullet_callback(bullet)
+            self.create_bullet_callback(self.position, bullet_velocity)
 
             dir2 = self.direction.rotate(-self.MANEUVERABILITY * 3)
             bullet_velocity = dir2 * self.bullet_speed + self.velocity
-            bullet = Bullet(self.position, bullet_velocity)
-            self.create_bullet_callback(bullet)
-
-        # Play laser sound based on the current volume
-        if volume > 0:
-            self.laser_sound.set_volume(volume / 100)
-        else:
-            self.laser_sound.set_volume(0)
-        self.laser_sound.play()
+            self.create_bullet_callback(self.position, bullet_velocity)
 
     # Function for drawing the spaceship, overloads the parent function
-    def draw(self, surface, s_type):
+    def draw(self, surface, s_type, alpha=1, camera=None):
         angle = self.direction.angle_to(UP)
+        position = self.screen_position(alpha, camera)
+
+        # Look up the rotation closest to the current angle, s_type 2 is the shielded sprite
+        if self.USE_ROTATION_CACHE:
+            rotations = self.rotations[1 if s_type == 1 else 2]
+            rotated_surface, offset = rotations[round(angle / self.MANEUVERABILITY) % len(rotations)]
+            return surface.blit(rotated_surface, position + offset)
 
         # Display an alternative sprite if shielded
         if s_type == 1:
@@ -120,73 +155,97 @@ class Spaceship(GameObject):
         else:
             rotated_surface = rotozoom(self.sprite_shield, angle, 1.0)
         rotated_surface_size = Vector2(rotated_surface.get_size())
-        blit_position = self.position - rotated_surface_size * 0.5
-        surface.blit(rotated_surface, blit_position)
+        blit_position = position - rotated_surface_size * 0.5
+        return surface.blit(rotated_surface, blit_position)
 
 
 class Asteroid(GameObject):
 
-    # Asteroids start of at size 3
-    def __init__(self, position, create_asteroid_callback, size=3):
+    # Set up the 3 possible sizes of asteroid
+    SIZE_TO_SCALE = {3: 1, 2: 0.5, 1: 0.25, }
+
+    # When an EntityStore is given, position and velocity live in a row of its arrays
+    position = StoredVector("positions")
+    velocity = StoredVector("velocities")
+
+    __slots__ = ("_position", "_velocity", "store", "slot", "create_asteroid_callback", "size", "rng")
 
-        # Callback function
+    # Asteroids start of at size 3, rng is used for their speed and direction
+    def __init__(self, position, create_asteroid_callback, size=3, store=None, rng=random):
+
+        # Called with the position and size of each piece when the asteroid splits
         self.create_asteroid_callback = create_asteroid_callback
         self.size = size
+        self.rng = rng
 
-        # Set up the 3 possible sizes of asteroid
-        size_to_scale = {3: 1, 2: 0.5, 1: 0.25, }
-        scale = size_to_scale[size]
-        sprite = rotozoom(load_sprite("asteroid"), 0, scale)
+        # The scaled sprites are cached, so splitting an asteroid does not rescale the image again
+        sprite = load_sprite("asteroid", scale=self.SIZE_TO_SCALE[size])
 
-        super().__init__(position, sprite, get_random_velocity(1, 3))
+        self.store = store
+        self.slot = store.add(sprite.get_width() / 2, wraps=True) if store is not None else None
+        super().__init__(position, sprite, get_random_velocity(1, 3, rng))
 
     # Splits into smaller asteroids when hit with a bullet
     def split(self):
         if self.size > 1:
             for _ in range(2):
-                asteroid = Asteroid(self.position, self.create_asteroid_callback, self.size - 1)
-                self.create_asteroid_callback(asteroid)
+                self.create_asteroid_callback(self.position, self.size - 1)
 
 
 class Bullet(GameObject):
-    def __init__(self, position, velocity):
-        super().__init__(position, load_sprite("bullet"), velocity)
+
+    # Stored the same way as asteroids when an EntityStore is given
+    position = StoredVector("positions")
+    velocity = StoredVector("velocities")
+
+    __slots__ = ("_position", "_velocity", "store", "slot")
+
+    def __init__(self, position, velocity, store=None):
+        sprite = load_sprite("bullet")
+        self.store = store
+        self.slot = store.add(sprite.get_width() / 2, wraps=False) if store is not None else None
+        super().__init__(position, sprite, velocity)
 
     # Overload the move class to stop bullets from wrapping around the screen
-    def move(self, surface):
+    def move(self, size):
         self.position = self.position + self.velocity
 
 
 # A powerup class for powerups to inherit from
 class Powerup(GameObject):
+    __slots__ = ()
+
     def __init__(self, position, p_type):
-        self.powerup_sound = load_sound("powerup")
         super().__init__(position, load_sprite(p_type), Vector2(0))
 
-    # Plays powerup pickup sound based on the current volume
-    def pickup_sound(self, volume):
-        if volume > 0:
-            self.powerup_sound.set_volume(volume / 100)
-        else:
-            self.powerup_sound.set_volume(0)
-        self.powerup_sound.play()
-
 
 class Shield(Powerup):
+    __slots__ = ()
+
     def __init__(self, position):
         super().__init__(position, "powerup_shield")
 
 
 class ShipSpeed(Powerup):
+    __slots__ = ()
+
     def __init__(self, position):
         super().__init__(position, "powerup_ship_speed")
 
 
 class BulletSpeed(Powerup):
+    __slots__ = ()
+
     def __init__(self, position):
         super().__init__(position, "powerup_bullet_speed")
 
 
 class MultiShot(Powerup):
+    __slots__ = ()
+
     def __init__(self, position):
         super().__init__(position, "powerup_multi_shot")
+
+
+# Every kind of powerup, e.g. for saving which kind a powerup is as a number
+POWERUP_TYPES = (Shield, ShipSpeed, BulletSpeed, MultiShot)
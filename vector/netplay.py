@@ -0,0 +1,541 @@
+import argparse
+import json
+import queue
+import struct
+import threading
+import time
+from collections import deque
+from multiprocessing import AuthenticationError, get_context
+from multiprocessing.connection import Client, Listener
+
+from pygame.math import Vector2
+
+from models import Asteroid, Bullet, Spaceship, POWERUP_TYPES
+from replay import Recorder, encode_controls, decode_controls, read_recording
+from simulation import Simulation, random_inputs
+
+# Runs the simulation in its own process, so other processes on this machine can play or watch the same game.
+# One client plays, it sends its Controls and the server runs a tick for each of them. Every client, including
+# the player, gets a snapshot after every tick. Snapshots only hold what changed since the client's last one:
+# objects that appeared, objects that disappeared, and objects that are no longer where the client expects them.
+# Clients move the objects they know about by their velocity every snapshot, so an asteroid flying in a
+# straight line is sent once. Snapshots are laid out as:
+#   HEADER, MESSAGE and the message as utf-8 text, WORLD and the tuning as JSON text in keyframes,
+#   SHIP if the ship is alive, COUNTS, then that many NEW, MOVED, REMOVED and EVENT records
+# Objects are identified by their kind and the handle their EntityList gave them
+
+DEFAULT_ADDRESS = ("localhost", 5151)
+AUTHKEY = b"vector"
+
+# The first message from a client says whether it plays or watches
+PLAY = b"P"
+WATCH = b"W"
+
+# Messages from the player, a byte saying what it is followed by its arguments.
+# A reset is followed by the tuning of the new round as JSON text, or nothing to keep the tuning
+INPUT = struct.Struct("<BB")
+RESET = struct.Struct("<B?Q")
+QUIT = struct.Struct("<B")
+INPUT_MESSAGE, RESET_MESSAGE, QUIT_MESSAGE = 1, 2, 3
+
+# flags, tick, score, seed, world width and height, when it was sent (perf_counter) and ms the tick took
+HEADER = struct.Struct("<BIIQHHdf")
+# length of the message
+MESSAGE = struct.Struct("<H")
+# active radius of the simulation (0 without one) and length of the tuning
+WORLD = struct.Struct("<dH")
+# position, velocity and direction of the ship
+SHIP = struct.Struct("<6f")
+# number of NEW, MOVED, REMOVED and EVENT records, a keyframe of a large world can have a lot of them
+COUNTS = struct.Struct("<IIII")
+# kind, handle, asteroid size or powerup type, position and velocity
+NEW = struct.Struct("<BIBffff")
+# kind, handle, position and velocity
+MOVED = struct.Struct("<BIffff")
+REMOVED = struct.Struct("<BI")
+# event name, position
+EVENT = struct.Struct("<Bff")
+
+# Header flags
+SHIP_ALIVE = 1
+SHIELD = 2
+GAME_OVER = 4
+KEYFRAME = 8
+TICKED = 16
+
+ASTEROID, BULLET, POWERUP = 0, 1, 2
+EVENTS = ("laser", "rock_break", "ship_explosion", "powerup", "game_over")
+
+
+# Moves an object the way the client expects it to move in one tick: asteroids wrap around the world,
+# bullets fly on and powerups stay put. Server and client both run this on the same numbers
+def advance(kind, state, size):
+    if kind == ASTEROID:
+        state[0] = (state[0] + state[2]) % size[0]
+        state[1] = (state[1] + state[3]) % size[1]
+    elif kind == BULLET:
+        state[0] += state[2]
+        state[1] += state[3]
+
+
+# Turns the simulation into snapshots for one client, keeping track of where that client thinks everything is
+class SnapshotEncoder:
+
+    # How far off (in pixels) the client's idea of a position can get before the object is sent again
+    TOLERANCE = 0.5
+
+    def __init__(self):
+        # Position and velocity of every object the client knows about, as the client has them
+        self.known = {}
+        self.keyframe = True
+
+    def encode(self, sim, flags=0, tick_ms=0):
+        known = self.known
+        size = sim.size
+        if self.keyframe:
+            known.clear()
+            flags |= KEYFRAME
+            self.keyframe = False
+        else:
+            for key, state in known.items():
+                advance(key[0], state, size)
+
+        new = []
+        moved = []
+        seen = set()
+        tolerance = self.TOLERANCE
+        for kind, objects in ((ASTEROID, sim.asteroids), (BULLET, sim.bullets), (POWERUP, sim.powerups)):
+            for game_object in objects:
+                key = (kind, game_object.handle)
+                seen.add(key)
+                x, y = game_object.position
+                vx, vy = game_object.velocity
+                state = known.get(key)
+                if state is None:
+                    if kind == ASTEROID:
+                        variant = game_object.size
+                    elif kind == POWERUP:
+                        variant = POWERUP_TYPES.index(type(game_object))
+                    else:
+                        variant = 0
+                    record = NEW.pack(kind, key[1], variant, x, y, vx, vy)
+                    known[key] = list(NEW.unpack(record)[3:])
+                    new.append(record)
+                elif (abs(state[0] - x) > tolerance or abs(state[1] - y) > tolerance or
+                      abs(state[2] - vx) > 1e-3 or abs(state[3] - vy) > 1e-3):
+                    record = MOVED.pack(kind, key[1], x, y, vx, vy)
+                    known[key] = list(MOVED.unpack(record)[2:])
+                    moved.append(record)
+
+        removed = [key for key in known if key not in seen]
+        for key in removed:
+            del known[key]
+
+        ship = sim.spaceship
+        if ship:
+            flags |= SHIP_ALIVE
+        if "shield" in sim.effects:
+            flags |= SHIELD
+        if sim.game_over:
+            flags |= GAME_OVER
+        message = sim.message.encode()
+        events = sim.events if flags & TICKED else ()
+
+        parts = [HEADER.pack(flags, sim.ticks, sim.score, sim.seed, size[0], size[1], time.perf_counter(), tick_ms),
+                 MESSAGE.pack(len(message)), message]
+        if flags & KEYFRAME:
+            tuning = json.dumps(sim.tuning).encode()
+            parts += [WORLD.pack(sim.active_radius or 0, len(tuning)), tuning]
+        if ship:
+            parts.append(SHIP.pack(*ship.position, *ship.velocity, *ship.direction))
+        parts.append(COUNTS.pack(len(new), len(moved), len(removed), len(events)))
+        parts += new
+        parts += moved
+        parts += [REMOVED.pack(kind, handle) for kind, handle in removed]
+        parts += [EVENT.pack(EVENTS.index(name), *position) for name, position in events]
+        return b"".join(parts)
+
+
+# The server side, it owns the Simulation and answers the player's messages
+class Server:
+
+    # How long to wait for the player before looking for new spectators again, in seconds
+    POLL_TIME = 0.05
+
+    def __init__(self, sim, listener):
+        self.sim = sim
+        self.listener = listener
+        self.joining = queue.Queue()
+        self.player = None
+        self.spectators = []
+        self.closed = False
+
+    # Accepts connections on a thread of its own, they are only used by the server's main thread
+    def _accept(self):
+        while not self.closed:
+            try:
+                conn = self.listener.accept()
+                role = conn.recv_bytes()
+            except (OSError, EOFError, AuthenticationError):
+                continue
+            self.joining.put((conn, role))
+
+    # Sends the state of the game to a client that just connected
+    def _join(self):
+        while not self.joining.empty():
+            conn, role = self.joining.get()
+            client = (conn, SnapshotEncoder())
+            if role == PLAY and self.player is None:
+                self.player = client
+            else:
+                self.spectators.append(client)
+            self._send(client, self.sim, 0, 0)
+
+    def _send(self, client, sim, flags, tick_ms):
+        conn, encoder = client
+        try:
+            conn.send_bytes(encoder.encode(sim, flags, tick_ms))
+        except OSError:
+            if client in self.spectators:
+                self.spectators.remove(client)
+                conn.close()
+
+    def _broadcast(self, flags, tick_ms=0):
+        for client in [self.player, *self.spectators]:
+            self._send(client, self.sim, flags, tick_ms)
+
+    # Runs ticks as the player's input comes in, until the player quits or goes away
+    def run(self):
+        threading.Thread(target=self._accept, daemon=True).start()
+        while self.player is None:
+            self._join()
+            time.sleep(self.POLL_TIME)
+
+        conn = self.player[0]
+        while True:
+            self._join()
+            try:
+                if not conn.poll(self.POLL_TIME):
+                    continue
+                data = conn.recv_bytes()
+            except (OSError, EOFError):
+                break
+
+            if data[0] == INPUT_MESSAGE:
+                start = time.perf_counter()
+                self.sim.tick(decode_controls(INPUT.unpack(data)[1]))
+                self._broadcast(TICKED, (time.perf_counter() - start) * 1000)
+            elif data[0] == RESET_MESSAGE:
+                _, has_seed, seed = RESET.unpack_from(data)
+                tuning = json.loads(data[RESET.size:].decode()) if len(data) > RESET.size else None
+                self.sim.reset(seed if has_seed else None, tuning)
+                for _, encoder in [self.player, *self.spectators]:
+                    encoder.keyframe = True
+                self._broadcast(0)
+            else:
+                break
+
+        self.closed = True
+        for client_conn, _ in [self.player, *self.spectators]:
+            client_conn.close()
+        self.listener.close()
+
+
+# Runs a server until its player is done, this is the target of the server process.
+# ready is a Connection the address is sent to once clients can connect
+def serve(address=DEFAULT_ADDRESS, size=Simulation.WORLD_SIZE, tuning=None, use_numpy=False, ready=None):
+    listener = Listener(address, authkey=AUTHKEY)
+    if ready is not None:
+        ready.send(listener.address)
+        ready.close()
+    Server(Simulation(None, size, use_numpy, tuning), listener).run()
+
+
+# Starts a server in a new process and returns the process and the address to connect to.
+# The process is started fresh instead of forked, so it doesn't inherit the window
+def start_server(address=("localhost", 0), size=Simulation.WORLD_SIZE, tuning=None, use_numpy=False):
+    context = get_context("spawn")
+    ready, child_ready = context.Pipe(False)
+    process = context.Process(target=serve, args=(address, size, tuning, use_numpy, child_ready), daemon=True)
+    process.start()
+    child_ready.close()
+    return process, ready.recv()
+
+
+# Stands in for a Simulation on the client side. tick() sends the Controls to the server and applies the
+# snapshots that came back, so Vector can play through a server the same way it plays locally.
+# The player keeps one tick in flight, the server works on it while the client draws the last one.
+# Objects are the usual models, drawn between snapshots with their velocity like they are between local ticks
+class RemoteSimulation:
+
+    IN_FLIGHT = 1
+
+    # conn is an open connection to use instead of connecting to address, e.g. one end of a Pipe
+    def __init__(self, address=DEFAULT_ADDRESS, spectate=False, conn=None):
+        self.conn = conn if conn is not None else Client(address, authkey=AUTHKEY)
+        self.conn.send_bytes(WATCH if spectate else PLAY)
+        self.spectate = spectate
+
+        self.objects = ({}, {}, {})
+        self.states = {}
+        self.ship = Spaceship((0, 0), lambda position, velocity: None)
+        self.spaceship = None
+        self.effects = set()
+        self.events = []
+        self.message = ""
+        self.score = 0
+        self.ticks = 0
+        self.seed = 0
+        self.size = None
+        self.active_radius = None
+        self.tuning = {}
+        self.game_over = False
+
+        # Network statistics, when each unanswered input was sent and how long answers took
+        self.sent = deque()
+        self.latencies = deque(maxlen=1000)
+        self.delays = deque(maxlen=1000)
+        self.server_times = deque(maxlen=1000)
+        self.snapshots = 0
+        self.keyframes = 0
+        self.total_bytes = 0
+        self.keyframe_bytes = 0
+        self.max_bytes = 0
+
+        # The server sends everything it has as soon as a client connects
+        self._wait_for_keyframe()
+
+    # Sends the player's input for the next tick and applies the snapshots that are in.
+    # Spectators only apply the snapshots
+    def tick(self, controls):
+        self.events = []
+        if self.spectate:
+            while self.conn.poll():
+                self._receive()
+            return
+
+        self.conn.send_bytes(INPUT.pack(INPUT_MESSAGE, encode_controls(controls)))
+        self.sent.append(time.perf_counter())
+        while len(self.sent) > self.IN_FLIGHT or self.conn.poll():
+            self._receive()
+
+    # The player asks the server for a new round, with new tuning like Simulation.reset if it is given.
+    # Spectators keep watching the round that is being played.
+    # They don't wait for the player to start the next one, that could take any amount of time, so game_over
+    # stays set until the first snapshot of the next round comes in with tick
+    def reset(self, seed=None, tuning=None):
+        if not self.spectate:
+            message = RESET.pack(RESET_MESSAGE, seed is not None, seed or 0)
+            if tuning is not None:
+                message += json.dumps(tuning).encode()
+            self.conn.send_bytes(message)
+            self.sent.clear()
+            self._wait_for_keyframe()
+        else:
+            self.tick(None)
+
+    def _wait_for_keyframe(self):
+        while not self._receive() & KEYFRAME:
+            pass
+        self.events = []
+
+    # Stops playing, the server ends the game when its player quits
+    def close(self):
+        if not self.spectate:
+            self.conn.send_bytes(QUIT.pack(QUIT_MESSAGE))
+        self.conn.close()
+
+    # Applies the next snapshot and returns its flags
+    def _receive(self):
+        data = self.conn.recv_bytes()
+        now = time.perf_counter()
+        flags, self.ticks, self.score, self.seed, w, h, sent, tick_ms = HEADER.unpack_from(data)
+        self.size = (w, h)
+        offset = HEADER.size + MESSAGE.size
+        length, = MESSAGE.unpack_from(data, HEADER.size)
+        self.message = data[offset:offset + length].decode()
+        offset += length
+        if flags & KEYFRAME:
+            active_radius, length = WORLD.unpack_from(data, offset)
+            offset += WORLD.size
+            self.active_radius = active_radius or None
+            self.tuning = json.loads(data[offset:offset + length].decode())
+            offset += length
+
+        if flags & TICKED and self.sent:
+            self.latencies.append(now - self.sent.popleft())
+        self.delays.append(now - sent)
+        self.server_times.append(tick_ms)
+        self.snapshots += 1
+        self.total_bytes += len(data)
+        self.max_bytes = max(self.max_bytes, len(data))
+        if flags & KEYFRAME:
+            self.keyframes += 1
+            self.keyframe_bytes += len(data)
+
+        ship = self.ship
+        if flags & SHIP_ALIVE:
+            x, y, vx, vy, dx, dy = SHIP.unpack_from(data, offset)
+            offset += SHIP.size
+            ship.position = Vector2(x, y)
+            ship.velocity = Vector2(vx, vy)
+            ship.direction = Vector2(dx, dy)
+            self.spaceship = ship
+        else:
+            self.spaceship = None
+        self.effects = {"shield"} if flags & SHIELD else set()
+        self.game_over = bool(flags & GAME_OVER)
+
+        new, moved, removed, events = COUNTS.unpack_from(data, offset)
+        offset += COUNTS.size
+
+        # Move everything along first, the server only sent what ended up somewhere else
+        states = self.states
+        objects = self.objects
+        if flags & KEYFRAME:
+            states.clear()
+            for kind_objects in objects:
+                kind_objects.clear()
+        else:
+            size = self.size
+            for key, state in states.items():
+                advance(key[0], state, size)
+
+        end = offset + new * NEW.size
+        for kind, handle, variant, x, y, vx, vy in NEW.iter_unpack(data[offset:end]):
+            states[(kind, handle)] = [x, y, vx, vy]
+            objects[kind][handle] = self._create(kind, variant, x, y, vx, vy)
+        offset = end
+
+        end = offset + moved * MOVED.size
+        for kind, handle, x, y, vx, vy in MOVED.iter_unpack(data[offset:end]):
+            states[(kind, handle)] = [x, y, vx, vy]
+            objects[kind][handle].velocity = Vector2(vx, vy)
+        offset = end
+
+        end = offset + removed * REMOVED.size
+        for kind, handle in REMOVED.iter_unpack(data[offset:end]):
+            del states[(kind, handle)]
+            del objects[kind][handle]
+        offset = end
+
+        for code, x, y in EVENT.iter_unpack(data[offset:offset + events * EVENT.size]):
+            self.events.append((EVENTS[code], Vector2(x, y)))
+
+        for key, state in states.items():
+            objects[key[0]][key[1]].position = Vector2(state[0], state[1])
+        return flags
+
+    @staticmethod
+    def _create(kind, variant, x, y, vx, vy):
+        if kind == ASTEROID:
+            game_object = Asteroid((x, y), None, variant)
+        elif kind == BULLET:
+            game_object = Bullet((x, y), (vx, vy))
+        else:
+            game_object = POWERUP_TYPES[variant]((x, y))
+        game_object.velocity = Vector2(vx, vy)
+        return game_object
+
+    def game_objects(self):
+        game_objects = [*self.objects[ASTEROID].values(), *self.objects[BULLET].values(),
+                        *self.objects[POWERUP].values()]
+        if self.spaceship:
+            game_objects.append(self.spaceship)
+        return game_objects
+
+    def visible_objects(self, camera):
+        game_objects = [game_object for objects in self.objects for game_object in objects.values()
+                        if camera.sees(game_object.position, game_object.radius)]
+        if self.spaceship:
+            game_objects.append(self.spaceship)
+        return game_objects
+
+    def entity_counts(self):
+        asteroids, bullets, powerups = self.objects
+        return {"asteroids": len(asteroids), "bullets": len(bullets), "powerups": len(powerups)}
+
+    # Snapshot sizes in bytes, and the times in ms from sending an input to getting its snapshot (latency),
+    # from the server sending a snapshot to it being applied (delay) and the server's tick (server)
+    def stats(self):
+        def percentiles(values, scale=1):
+            values = sorted(values)
+            if not values:
+                return 0, 0, 0
+            last = len(values) - 1
+            return tuple(values[round(last * p)] * scale for p in (.5, .95, .99))
+
+        deltas = self.snapshots - self.keyframes
+        return {
+            "snapshots": self.snapshots,
+            "keyframes": self.keyframes,
+            "avg_bytes": (self.total_bytes - self.keyframe_bytes) / deltas if deltas else 0,
+            "avg_keyframe_bytes": self.keyframe_bytes / self.keyframes if self.keyframes else 0,
+            "max_bytes": self.max_bytes,
+            "latency": percentiles(self.latencies, 1000),
+            "delay": percentiles(self.delays, 1000),
+            "server": percentiles(self.server_times),
+        }
+
+
+if __name__ == "__main__":
+    # Plays random input through a server process as fast as possible and reports what the network costs,
+    # e.g. "python netplay.py --ticks 5000 --spectators 2".
+    # With --record the rounds are also recorded on the player's side and replayed locally afterwards,
+    # every round that was finished has to end with the score it had on the server
+    parser = argparse.ArgumentParser(description="Measure Vector's client/server mode without a window")
+    parser.add_argument("--ticks", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spectators", type=int, default=1, help="clients that watch the game")
+    parser.add_argument("--asteroids", type=int, help="how many asteroids each round starts with")
+    parser.add_argument("--record", metavar="FILE", help="record the rounds and check that they replay the same way")
+    args = parser.parse_args()
+
+    tuning = {"START_ASTEROIDS": args.asteroids} if args.asteroids else None
+    process, address = start_server(tuning=tuning)
+    player = RemoteSimulation(address)
+    spectators = [RemoteSimulation(address, spectate=True) for _ in range(args.spectators)]
+    recorder = Recorder(args.record) if args.record else None
+    scores = []
+
+    inputs = random_inputs(args.seed)
+    seed = args.seed
+    player.reset(seed)
+    if recorder:
+        recorder.start_round(player.seed, player.size, player.active_radius, player.tuning)
+    start = time.perf_counter()
+    for tick in range(args.ticks):
+        controls = next(inputs)
+        player.tick(controls)
+        if recorder:
+            recorder.record(controls)
+        for spectator in spectators:
+            spectator.tick(None)
+        if player.game_over:
+            scores.append(player.score)
+            seed += 1
+            player.reset(seed)
+            if recorder:
+                recorder.end_round()
+                recorder.start_round(player.seed, player.size, player.active_radius, player.tuning)
+    seconds = time.perf_counter() - start
+    player.close()
+    process.join()
+
+    print(f"{args.ticks} ticks in {seconds:.2f} s, {args.ticks / seconds:.0f} ticks per second")
+    for name, client in [("player", player)] + [(f"spectator {x + 1}", s) for x, s in enumerate(spectators)]:
+        stats = client.stats()
+        print(f"{name}: {stats['snapshots']} snapshots, {stats['avg_bytes']:.0f} bytes per tick on average, "
+              f"{stats['avg_keyframe_bytes']:.0f} per keyframe, {stats['max_bytes']} at most")
+        for key in ("latency", "delay", "server"):
+            if key != "latency" or not client.spectate:
+                p50, p95, p99 = stats[key]
+                print(f"    {key:<8} p50 {p50:.3f}  p95 {p95:.3f}  p99 {p99:.3f} ms")
+
+    if recorder:
+        recorder.end_round()
+        for recorded, score in zip(read_recording(args.record), scores):
+            sim = Simulation(recorded.seed, recorded.size, tuning=recorded.tuning, active_radius=recorded.active_radius)
+            sim.run(recorded.controls())
+            assert sim.score == score, f"round with seed {recorded.seed} replayed to {sim.score} instead of {score}"
+        print(f"{len(scores)} recorded rounds replayed to the same scores")
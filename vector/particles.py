@@ -0,0 +1,216 @@
+import random
+from math import cos, sin, pi
+
+import pygame
+
+# numpy is optional, without it the particles are moved one by one and far fewer of them are allowed
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# How each kind of particle looks and moves: the colors it goes through as it gets older, the range of its speed
+# and of how many ticks it lives, how much of its speed it keeps every tick and the size of its sprite
+PARTICLE_KINDS = {
+    "debris": {"colors": ("#c8b9a6", "#8c7b6b", "#4a4038"), "speed": (0.5, 3), "life": (20, 45), "drag": 0.97,
+               "size": 3},
+    "explosion": {"colors": ("#fff3b0", "#ffb347", "#d9482b", "#5a1a10"), "speed": (1, 6), "life": (30, 70),
+                  "drag": 0.95, "size": 4},
+    "thrust": {"colors": ("#ffe9a8", "#ff9a3c", "#7a3a12"), "speed": (1, 2.5), "life": (8, 16), "drag": 0.9,
+               "size": 2},
+}
+
+# The kind and number of particles sent out for the simulation's events, at the full budget
+BURSTS = {
+    "rock_break": ("debris", 24),
+    "ship_explosion": ("explosion", 160),
+}
+
+
+# Debris, explosions and the ship's exhaust. They are only for show, so they live outside the Simulation and
+# don't change how a round plays out. Particles are kept in preallocated arrays and moved in one batched step
+# per tick, then drawn with a single Surface.blits call from a small set of cached sprites.
+# The budget is how many particles can be alive at once. It shrinks when frames take too long and grows back
+# when they are quick again. Bursts get thinner as the budget shrinks instead of being dropped
+class ParticleSystem:
+
+    # The most particles there can be, and the budget's lower limit when frames are slow
+    LIMIT = 4000
+    MIN_BUDGET = 200
+
+    # Without numpy every particle costs a few Python operations per tick, so the limit is much lower
+    FALLBACK_LIMIT = 400
+
+    # Frames slower than this shrink the budget, frames much quicker let it grow again
+    TARGET_FRAME_TIME = 1 / 60
+
+    def __init__(self, limit=None, seed=None):
+        if limit is None:
+            limit = self.LIMIT if np is not None else self.FALLBACK_LIMIT
+        self.limit = limit
+        self.budget = limit
+        self.frame_time = 0
+        self.rng = random.Random(seed)
+        self.emitted = 0
+        self.dropped = 0
+
+        # One sprite for every color of every kind, a particle's sprite is the first one of its kind plus its age
+        self.sprites = []
+        self.kinds = {}
+        for name, kind in PARTICLE_KINDS.items():
+            self.kinds[name] = (len(self.sprites), len(kind["colors"]), kind)
+            for color in kind["colors"]:
+                self.sprites.append(self._make_sprite(kind["size"], color))
+        # Sprites are placed by their center, this is how far their top left corner is from it
+        self.offsets = [sprite.get_width() / 2 for sprite in self.sprites]
+
+        # x, y, vx, vy, ticks left, ticks it started with, drag, first sprite and number of sprites of each particle
+        if np is not None:
+            self.positions = np.zeros((limit, 2))
+            self.velocities = np.zeros((limit, 2))
+            self.life = np.zeros(limit)
+            self.max_life = np.ones(limit)
+            self.drag = np.ones(limit)
+            self.first_sprite = np.zeros(limit, dtype=int)
+            self.stages = np.ones(limit, dtype=int)
+            self.offsets = np.array(self.offsets)
+            self.count = 0
+        else:
+            self.particles = []
+
+    def __len__(self):
+        return self.count if np is not None else len(self.particles)
+
+    @staticmethod
+    def _make_sprite(size, color):
+        sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, color, (size / 2, size / 2), size / 2)
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()
+        return sprite
+
+    # Sends out particles for an event of the simulation, events without particles are ignored
+    def burst(self, event, position):
+        if event in BURSTS:
+            name, count = BURSTS[event]
+            self.emit(name, position, count)
+
+    # Sends out count particles of a kind from position, in directions up to spread/2 radians either side of angle
+    # and on top of base_velocity. The count is scaled down with the budget
+    def emit(self, name, position, count, angle=0, spread=2 * pi, base_velocity=(0, 0)):
+        first, stages, kind = self.kinds[name]
+        wanted = count
+        count = min(max(1, round(count * self.budget / self.limit)), self.budget - len(self))
+        self.dropped += wanted - max(count, 0)
+        if count <= 0:
+            return
+        self.emitted += count
+
+        rng = self.rng
+        low, high = kind["speed"]
+        shortest, longest = kind["life"]
+        x, y = position
+        bx, by = base_velocity
+        new = []
+        for _ in range(count):
+            direction = angle + (rng.random() - 0.5) * spread
+            speed = rng.uniform(low, high)
+            life = rng.randint(shortest, longest)
+            new.append((x, y, bx + cos(direction) * speed, by + sin(direction) * speed, life, life, kind["drag"],
+                        first, stages))
+
+        if np is None:
+            self.particles.extend(list(particle) for particle in new)
+            return
+
+        start, end = self.count, self.count + count
+        values = np.array(new)
+        self.positions[start:end] = values[:, 0:2]
+        self.velocities[start:end] = values[:, 2:4]
+        self.life[start:end] = values[:, 4]
+        self.max_life[start:end] = values[:, 5]
+        self.drag[start:end] = values[:, 6]
+        self.first_sprite[start:end] = first
+        self.stages[start:end] = stages
+        self.count = end
+
+    # Moves every particle one tick and drops the ones that ran out of life
+    def update(self):
+        if np is None:
+            for particle in self.particles:
+                particle[0] += particle[2]
+                particle[1] += particle[3]
+                particle[2] *= particle[6]
+                particle[3] *= particle[6]
+                particle[4] -= 1
+            self.particles = [particle for particle in self.particles if particle[4] > 0]
+            return
+
+        n = self.count
+        if not n:
+            return
+        self.positions[:n] += self.velocities[:n]
+        self.velocities[:n] *= self.drag[:n, None]
+        self.life[:n] -= 1
+
+        # Keep the living particles at the front of the arrays, in the order they were sent out
+        alive = self.life[:n] > 0
+        living = int(alive.sum())
+        if living < n:
+            for values in (self.positions, self.velocities, self.life, self.max_life, self.drag, self.first_sprite,
+                           self.stages):
+                values[:living] = values[:n][alive]
+            self.count = living
+
+    def clear(self):
+        if np is None:
+            self.particles = []
+        else:
+            self.count = 0
+
+    # Keeps the budget in line with how long frames take, frame_time is the last frame's length in seconds.
+    # The average over the last frames is used so a single slow frame doesn't throw the particles away
+    def adapt(self, frame_time):
+        self.frame_time += (frame_time - self.frame_time) * 0.1
+        if self.frame_time > self.TARGET_FRAME_TIME * 1.1:
+            self.budget = max(min(self.MIN_BUDGET, self.limit), int(self.budget * 0.9))
+        elif self.frame_time < self.TARGET_FRAME_TIME * 0.7:
+            self.budget = min(self.limit, self.budget + max(1, self.limit // 100))
+
+    # Draws the particles alpha of the way between the last tick and the next one, like the other objects.
+    # Returns the rects that were drawn into if return_rects is set, or an empty list
+    def draw(self, surface, alpha=1, camera=None, return_rects=False):
+        back = 1 - alpha if alpha < 1 else 0
+        if np is None:
+            sprites = self.sprites
+            offsets = self.offsets
+            blits = []
+            for x, y, vx, vy, life, max_life, _, first, stages in self.particles:
+                index = first + min(stages - 1, int((1 - life / max_life) * stages))
+                x -= vx * back
+                y -= vy * back
+                if camera is not None:
+                    x, y = camera.to_screen((x, y))
+                blits.append((sprites[index], (x - offsets[index], y - offsets[index])))
+        else:
+            n = self.count
+            if not n:
+                return []
+            positions = self.positions[:n] - self.velocities[:n] * back
+            if camera is not None:
+                positions -= (camera.left, camera.top)
+                positions %= camera.world_size
+            age = 1 - self.life[:n] / self.max_life[:n]
+            indices = self.first_sprite[:n] + np.minimum(self.stages[:n] - 1, (age * self.stages[:n]).astype(int))
+            positions -= self.offsets[indices, None]
+            blits = list(zip(map(self.sprites.__getitem__, indices.tolist()), positions.tolist()))
+
+        if return_rects:
+            return surface.blits(blits)
+        surface.blits(blits, False)
+        return []
+
+    def stats(self):
+        return {"live": len(self), "budget": self.budget, "limit": self.limit, "emitted": self.emitted,
+                "dropped": self.dropped}
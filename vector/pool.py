@@ -0,0 +1,33 @@
+# A free list for one type of game object.
+# Released objects are kept and handed out again by acquire, which runs the constructor on the old object
+# to reset it in place, so long sessions don't keep allocating and garbage collecting new objects
+class Pool:
+
+    def __init__(self, object_type):
+        self.object_type = object_type
+        self.free = []
+        self.live = 0
+        self.high_water = 0
+        self.created = 0
+
+    # Returns an object set up with the given constructor arguments, reusing a released one if there is one
+    def acquire(self, *args):
+        if self.free:
+            game_object = self.free.pop()
+            game_object.__init__(*args)
+        else:
+            game_object = self.object_type(*args)
+            self.created += 1
+
+        self.live += 1
+        if self.live > self.high_water:
+            self.high_water = self.live
+        return game_object
+
+    # Gives an object back to the pool, it must not be used by the game anymore
+    def release(self, game_object):
+        self.live -= 1
+        self.free.append(game_object)
+
+    def stats(self):
+        return {"live": self.live, "free": len(self.free), "high_water": self.high_water, "created": self.created}
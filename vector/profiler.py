@@ -0,0 +1,137 @@
+import json
+import time
+from collections import deque
+
+
+# Timing a section when the profiler is off does nothing
+class _NullSection:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+# Times one named section of a frame, sections opened inside other sections are named "outer/inner"
+class _Section:
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        profiler = self.profiler
+        profiler.stack.append(self.name)
+        self.full_name = "/".join(profiler.stack)
+        # Adding the name now keeps sections in the order they started, so outer sections come before inner ones
+        profiler.current.setdefault(self.full_name, 0)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        profiler = self.profiler
+        profiler.stack.pop()
+        profiler.current[self.full_name] += end - self.start
+        profiler.trace.append((self.full_name, self.start, end - self.start))
+        return False
+
+
+# Measures how long each phase of a frame takes, e.g. input, game logic and drawing.
+# Wrap a phase in "with profiler.section(name):" and call begin_frame and end_frame around each frame.
+# The last WINDOW frames are kept to report percentiles, and the most recent sections are kept as a trace
+# that can be saved in the Chrome trace format (open it in chrome://tracing or https://ui.perfetto.dev).
+# While the profiler is disabled every call returns straight away
+class Profiler:
+    # Frames used for the percentiles
+    WINDOW = 300
+    # Sections kept for the trace file
+    TRACE_LENGTH = 200000
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stack = []
+        self.current = {}
+        self.frame_start = 0
+        self.frames = 0
+        self.times = {}
+        self.counts = {}
+        self.trace = deque(maxlen=self.TRACE_LENGTH)
+        self.pending_reset = False
+
+    def section(self, name):
+        if not self.enabled:
+            return _NULL_SECTION
+        return _Section(self, name)
+
+    def begin_frame(self):
+        if self.pending_reset:
+            self._clear()
+        if not self.enabled:
+            return
+        self.current = {}
+        self.frame_start = time.perf_counter_ns()
+
+    # Ends the frame, counts is a dictionary of anything worth showing next to the times, like entity counts
+    def end_frame(self, counts=None):
+        if not self.enabled or not self.frame_start:
+            return
+        end = time.perf_counter_ns()
+        self.current["frame"] = end - self.frame_start
+        self.trace.append(("frame", self.frame_start, end - self.frame_start))
+        self.frame_start = 0
+        self.frames += 1
+
+        for name, duration in self.current.items():
+            times = self.times.get(name)
+            if times is None:
+                times = self.times[name] = deque(maxlen=self.WINDOW)
+            times.append(duration)
+        if counts:
+            self.counts = counts
+
+    # Returns the 50th, 95th and 99th percentile of a section's time in milliseconds over the last frames
+    def percentiles(self, name):
+        times = sorted(self.times.get(name, ()))
+        if not times:
+            return 0, 0, 0
+        last = len(times) - 1
+        return tuple(times[round(last * p)] / 1e6 for p in (.5, .95, .99))
+
+    # Lines of text describing the last frames, the frame total first and then the sections in the order they ran
+    def report(self):
+        lines = ["section            p50     p95     p99  (ms)"]
+        for name in sorted(self.times, key=lambda name: name != "frame"):
+            p50, p95, p99 = self.percentiles(name)
+            lines.append(f"{name:<16}{p50:>6.2f}  {p95:>6.2f}  {p99:>6.2f}")
+        if self.counts:
+            lines.append("  ".join(f"{name}: {count}" for name, count in self.counts.items()))
+        return lines
+
+    # Saves the recorded sections in the Chrome trace event format
+    def dump_trace(self, path):
+        events = [{"name": name.split("/")[-1], "cat": name.split("/")[0], "ph": "X",
+                   "ts": start / 1000, "dur": duration / 1000, "pid": 0, "tid": 0}
+                  for name, start, duration in self.trace]
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+    # Forgets everything that was measured once the next frame begins, sections that are still open when this is
+    # called (e.g. the input section when F3 is pressed) need the stack and the current frame to close
+    def reset(self):
+        self.pending_reset = True
+
+    def _clear(self):
+        self.pending_reset = False
+        self.stack = []
+        self.current = {}
+        self.frame_start = 0
+        self.frames = 0
+        self.times = {}
+        self.counts = {}
+        self.trace.clear()
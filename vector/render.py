@@ -0,0 +1,118 @@
+import pygame
+
+
+# Collects the objects drawn in a frame grouped by their sprite, so every sprite is drawn with a single
+# Surface.blits call instead of one blit per object. Objects of the same sprite have the same radius, so the
+# blit positions of a group are worked out together. Objects that pick their sprite while drawing
+# (like the spaceship) are not batched and are drawn on their own after the groups
+class SpriteBatch:
+
+    def __init__(self):
+        self.groups = {}
+        self.unbatched = []
+
+    def add(self, game_objects):
+        groups = self.groups
+        for game_object in game_objects:
+            if game_object.BATCHED:
+                group = groups.get(game_object.sprite)
+                if group is None:
+                    groups[game_object.sprite] = [game_object]
+                else:
+                    group.append(game_object)
+            else:
+                self.unbatched.append(game_object)
+
+    # Draws everything that was added and empties the batch.
+    # Returns the rects that were drawn into if return_rects is set, or an empty list
+    def draw(self, surface, s_type, alpha=1, camera=None, return_rects=False):
+        rects = []
+        back = 1 - alpha if alpha < 1 else 0
+        for sprite, group in self.groups.items():
+            r = group[0].radius
+
+            # Same as GameObject.draw: step back from the current position, then place it in the camera's view
+            if back:
+                points = [game_object.position - game_object.velocity * back for game_object in group]
+            else:
+                points = [game_object.position for game_object in group]
+            if camera is not None:
+                w, h = camera.world_size
+                left = camera.left - r
+                top = camera.top - r
+                blits = [(sprite, ((x - left) % w - r * 2, (y - top) % h - r * 2)) for x, y in points]
+            else:
+                blits = [(sprite, (x - r, y - r)) for x, y in points]
+
+            if return_rects:
+                rects += surface.blits(blits)
+            else:
+                surface.blits(blits, False)
+
+        for game_object in self.unbatched:
+            rect = game_object.draw(surface, s_type, alpha, camera)
+            if return_rects:
+                rects.append(rect)
+        self.groups.clear()
+        self.unbatched.clear()
+        return rects
+
+
+# Draws the background, game objects and HUD onto the screen and pushes the frame to the display.
+# In dirty rect mode only the areas where objects were last frame, where they are now and where the HUD changed
+# are redrawn and sent to the display, instead of the whole screen
+class Renderer:
+
+    # If more than this fraction of the screen changed, a single flip is cheaper than updating every rect
+    FULL_FLIP_FRACTION = 0.4
+
+    def __init__(self, screen, background, dirty_rects=False):
+        self.screen = screen
+        self.background = background
+        self.dirty_rects = dirty_rects
+        self.batch = SpriteBatch()
+
+        # Where objects were drawn last frame, these areas are covered with background on the next frame
+        self.previous = []
+        self.full_redraw = True
+
+    # Forces the next frame to redraw the whole screen, e.g. after the window was covered
+    def invalidate(self):
+        self.full_redraw = True
+
+    # Draws the objects and particles and returns the rects they were drawn into,
+    # the rects are only needed in dirty rect mode
+    def _draw_objects(self, game_objects, s_type, alpha, camera, particles):
+        self.batch.add(game_objects)
+        rects = self.batch.draw(self.screen, s_type, alpha, camera, self.dirty_rects)
+        if particles is not None:
+            rects += particles.draw(self.screen, alpha, camera, self.dirty_rects)
+        return rects
+
+    # alpha is how far the game is between the last tick and the next one, objects are drawn that far along.
+    # With a camera the objects are drawn where they are in its view of the world.
+    # particles is a ParticleSystem drawn over the objects, or None
+    def render(self, game_objects, s_type, hud, alpha=1, camera=None, particles=None):
+        if not self.dirty_rects or self.full_redraw:
+            self.screen.blit(self.background, (0, 0))
+            self.previous = self._draw_objects(game_objects, s_type, alpha, camera, particles)
+            hud.dirty_rects()
+            hud.draw(self.screen)
+            pygame.display.flip()
+            self.full_redraw = False
+            return
+
+        # Cover up last frame's objects and the text, then draw everything in its new place.
+        # Text is antialiased, so it has to be drawn onto a clean background or its edges would build up
+        changed = self.previous + hud.dirty_rects() + hud.rects()
+        for rect in changed:
+            self.screen.blit(self.background, rect, rect)
+        self.previous = self._draw_objects(game_objects, s_type, alpha, camera, particles)
+        hud.draw(self.screen)
+        changed += self.previous
+
+        screen_area = self.screen.get_width() * self.screen.get_height()
+        if sum(rect.w * rect.h for rect in changed) > screen_area * self.FULL_FLIP_FRACTION:
+            pygame.display.flip()
+        else:
+            pygame.display.update(changed)
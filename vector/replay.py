@@ -0,0 +1,160 @@
+import argparse
+import json
+import struct
+
+from profiler import Profiler
+from simulation import Simulation, Controls
+
+# Recordings of the player's input, a round plays out exactly the same way again when the simulation is given
+# the same seed and Controls. The file starts with MAGIC and a version byte, followed by each round:
+#   seed, world width and height, active radius (0 without one), length of the tuning and the number of ticks
+#   ("<QHHdHI"), then the tuning as JSON text
+#   runs of identical ticks, each one a byte holding the Controls followed by how many ticks in a row it was held,
+#   written as a varint (7 bits per byte, the high bit is set when more bytes follow)
+# Holding a direction for a second is 2 or 3 bytes instead of 60 entries, so a long session stays small
+
+# The version also changes when the same seed and Controls would play out differently, e.g. version 2 places
+# asteroids with the spawner, so older recordings are refused instead of replaying a different game.
+# Version 3 adds the active radius and tuning, a large world or tuned round plays out differently without them
+MAGIC = b"VREC"
+VERSION = 3
+ROUND_HEADER = struct.Struct("<QHHdHI")
+
+# Shots are stored in 4 bits, nobody presses space more than 15 times in a frame
+MAX_SHOTS = 15
+
+
+# Packs Controls into a byte: 2 bits for rotate, 2 for thrust and 4 for the number of shots
+def encode_controls(controls):
+    return (controls.rotate + 1) | (controls.thrust + 1) << 2 | min(controls.shots, MAX_SHOTS) << 4
+
+
+def decode_controls(byte):
+    return Controls((byte & 3) - 1, (byte >> 2 & 3) - 1, byte >> 4)
+
+
+def _write_varint(data, value):
+    while value >= 0x80:
+        data.append(value & 0x7f | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def _read_varint(data, i):
+    value = shift = 0
+    while True:
+        byte = data[i]
+        i += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, i
+        shift += 7
+
+
+# Records the Controls of every tick and appends each round to the file when it ends
+class Recorder:
+
+    def __init__(self, path):
+        self.path = path
+        self.runs = None
+        with open(path, 'wb') as f:
+            f.write(MAGIC + bytes([VERSION]))
+
+    # active_radius and tuning are the ones the simulation was created with, see Simulation
+    def start_round(self, seed, size, active_radius=None, tuning=None):
+        self.seed = seed
+        self.size = size
+        self.active_radius = active_radius
+        self.tuning = json.dumps(tuning or {}).encode()
+        self.ticks = 0
+        self.runs = []
+
+    def record(self, controls):
+        byte = encode_controls(controls)
+        self.ticks += 1
+        if self.runs and self.runs[-1][0] == byte:
+            self.runs[-1][1] += 1
+        else:
+            self.runs.append([byte, 1])
+
+    # Writes the round to the file, this is safe to call more than once, e.g. when quitting after a round ended
+    def end_round(self):
+        if self.runs is None:
+            return
+        data = bytearray(ROUND_HEADER.pack(self.seed, self.size[0], self.size[1], self.active_radius or 0,
+                                           len(self.tuning), self.ticks))
+        data += self.tuning
+        for byte, count in self.runs:
+            data.append(byte)
+            _write_varint(data, count)
+        with open(self.path, 'ab') as f:
+            f.write(data)
+        self.runs = None
+
+
+# A round read from a recording
+class RecordedRound:
+
+    def __init__(self, seed, size, ticks, runs, active_radius=None, tuning=None):
+        self.seed = seed
+        self.size = size
+        self.ticks = ticks
+        self.runs = runs
+        self.active_radius = active_radius
+        self.tuning = tuning or {}
+
+    # The Controls for every tick of the round, in order
+    def controls(self):
+        for byte, count in self.runs:
+            controls = decode_controls(byte)
+            for _ in range(count):
+                yield controls
+
+
+# Reads every round in a recording
+def read_recording(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != MAGIC:
+        raise ValueError(f"{path} is not a Vector recording")
+    if data[4] != VERSION:
+        raise ValueError(f"{path} is recording version {data[4]}, only version {VERSION} can be played")
+
+    rounds = []
+    i = 5
+    while i < len(data):
+        seed, width, height, active_radius, length, ticks = ROUND_HEADER.unpack_from(data, i)
+        i += ROUND_HEADER.size
+        tuning = json.loads(data[i:i + length].decode())
+        i += length
+        runs = []
+        remaining = ticks
+        while remaining:
+            byte = data[i]
+            count, i = _read_varint(data, i + 1)
+            runs.append((byte, count))
+            remaining -= count
+        rounds.append(RecordedRound(seed, (width, height), ticks, runs, active_radius or None, tuning))
+    return rounds
+
+
+# Replays a recording headless as fast as possible, e.g. to profile a long session in a few seconds
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded session of Vector without a window")
+    parser.add_argument("recording")
+    parser.add_argument("--numpy", action="store_true", help="use the numpy entity store")
+    parser.add_argument("--trace", metavar="FILE", help="profile the replay and save a Chrome trace to FILE")
+    args = parser.parse_args()
+
+    profiler = Profiler(enabled=bool(args.trace))
+    for number, recorded in enumerate(read_recording(args.recording), 1):
+        simulation = Simulation(recorded.seed, recorded.size, args.numpy, recorded.tuning, profiler,
+                                recorded.active_radius)
+        result = simulation.run(recorded.controls())
+        print(f"round {number}: seed {recorded.seed}, score {simulation.score}, {result['ticks']} ticks "
+              f"in {result['seconds']:.2f}s ({result['ticks_per_second']:.0f} ticks per second)")
+
+    if args.trace:
+        for line in profiler.report():
+            print(line)
+        print(f"{profiler.dump_trace(args.trace)} trace events written to {args.trace}")
@@ -0,0 +1,222 @@
+import struct
+import sys
+from array import array
+from collections import deque
+
+from pygame.math import Vector2
+
+from models import POWERUP_TYPES
+
+# Saves everything needed to carry on with a round exactly where it was, down to the random number generator.
+# A state is laid out as:
+#   HEADER and the message as utf-8 text
+#   RNG and the generator's 625 words of internal state
+#   the number of effects, then each effect's name (a byte count and the name) and the tick it runs out on
+#   SHIP if the ship is alive
+#   for asteroids, bullets and powerups: LIST and then one array per column, e.g. all the handles of the asteroids,
+#   then all their sizes, then their positions and velocities as x, y, vx, vy for each asteroid
+# Columns are written as arrays in little endian order, so saving thousands of objects is a few bulk copies
+
+MAGIC = b"VSAV"
+VERSION = 1
+
+# magic, version, seed, ticks, score, asteroids destroyed, powerups collected, world width and height,
+# whether the ship is alive and the length of the message
+HEADER = struct.Struct("<4sBQIIIIHH?B")
+# version of the generator, whether it has a gaussian value waiting and that value
+RNG = struct.Struct("<B?d")
+EFFECT = struct.Struct("<I")
+# position, velocity, direction, acceleration, bullet speed and bullet amount
+SHIP = struct.Struct("<8dB")
+# next handle and the number of objects
+LIST = struct.Struct("<II")
+
+
+def _column(typecode, values):
+    column = array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+# Reads a column of count values and returns them with the offset after them
+def _read_column(typecode, data, offset, count):
+    column = array(typecode)
+    end = offset + count * column.itemsize
+    column.frombytes(data[offset:end])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column, end
+
+
+def _motion(game_objects):
+    values = []
+    for game_object in game_objects:
+        values.extend(game_object.position)
+        values.extend(game_object.velocity)
+    return values
+
+
+# Returns the state of a simulation as bytes
+def save_state(sim):
+    ship = sim.spaceship
+    message = sim.message.encode()
+    parts = [HEADER.pack(MAGIC, VERSION, sim.seed, sim.ticks, sim.score, sim.asteroids_destroyed,
+                         sim.powerups_collected, sim.size[0], sim.size[1], bool(ship), len(message)), message]
+
+    version, internal, gauss = sim.rng.getstate()
+    parts += [RNG.pack(version, gauss is not None, gauss or 0), _column("I", internal)]
+
+    ends = sim.effects.ends
+    parts.append(bytes([len(ends)]))
+    for name, end in ends.items():
+        name = name.encode()
+        parts += [bytes([len(name)]), name, EFFECT.pack(end)]
+
+    if ship:
+        parts.append(SHIP.pack(*ship.position, *ship.velocity, *ship.direction, ship.acceleration,
+                               ship.bullet_speed, ship.bullet_amount))
+
+    # Far away asteroids of a large world are moved later, so the tick each one was last moved is saved as well
+    asteroids = list(sim.asteroids)
+    if sim.far_updates:
+        groups = sim.asteroid_groups
+        last_moved = [groups[asteroid.handle % len(groups)][asteroid] for asteroid in asteroids]
+    else:
+        last_moved = [sim.ticks] * len(asteroids)
+    parts += [LIST.pack(sim.asteroids.next_handle, len(asteroids)),
+              _column("I", [asteroid.handle for asteroid in asteroids]),
+              _column("B", [asteroid.size for asteroid in asteroids]),
+              _column("d", _motion(asteroids)),
+              _column("I", last_moved)]
+
+    bullets = list(sim.bullets)
+    parts += [LIST.pack(sim.bullets.next_handle, len(bullets)),
+              _column("I", [bullet.handle for bullet in bullets]),
+              _column("d", _motion(bullets))]
+
+    powerups = list(sim.powerups)
+    positions = []
+    for powerup in powerups:
+        positions.extend(powerup.position)
+    parts += [LIST.pack(sim.powerups.next_handle, len(powerups)),
+              _column("I", [powerup.handle for powerup in powerups]),
+              _column("B", [POWERUP_TYPES.index(type(powerup)) for powerup in powerups]),
+              _column("d", positions)]
+    return b"".join(parts)
+
+
+# Puts a simulation back into a saved state. The simulation has to have the same world size
+# and tuning as the one that was saved, its objects go back to its pools
+def load_state(sim, data):
+    (magic, version, seed, ticks, score, destroyed, collected, width, height, ship_alive,
+     length) = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a Vector save state")
+    if version != VERSION:
+        raise ValueError(f"save state version {version}, only version {VERSION} can be loaded")
+    if (width, height) != tuple(sim.size):
+        raise ValueError(f"save state is for a {width}x{height} world, not {sim.size[0]}x{sim.size[1]}")
+
+    sim.clear(seed)
+    sim.ticks = ticks
+    sim.score = score
+    sim.asteroids_destroyed = destroyed
+    sim.powerups_collected = collected
+    offset = HEADER.size
+    sim.message = data[offset:offset + length].decode()
+    offset += length
+
+    rng_version, has_gauss, gauss = RNG.unpack_from(data, offset)
+    internal, offset = _read_column("I", data, offset + RNG.size, 625)
+    rng_state = (rng_version, tuple(internal), gauss if has_gauss else None)
+
+    count = data[offset]
+    offset += 1
+    for _ in range(count):
+        length = data[offset]
+        name = data[offset + 1:offset + 1 + length].decode()
+        offset += 1 + length
+        sim.effects.ends[name] = EFFECT.unpack_from(data, offset)[0]
+        offset += EFFECT.size
+
+    if ship_alive:
+        x, y, vx, vy, dx, dy, acceleration, bullet_speed, bullet_amount = SHIP.unpack_from(data, offset)
+        offset += SHIP.size
+        ship = sim.spaceship = sim.spaceship_type((x, y), sim._create_bullet)
+        ship.velocity = Vector2(vx, vy)
+        ship.direction = Vector2(dx, dy)
+        ship.acceleration = acceleration
+        ship.bullet_speed = bullet_speed
+        ship.bullet_amount = bullet_amount
+
+    next_handle, count = LIST.unpack_from(data, offset)
+    handles, offset = _read_column("I", data, offset + LIST.size, count)
+    sizes, offset = _read_column("B", data, offset, count)
+    motion, offset = _read_column("d", data, offset, count * 4)
+    last_moved, offset = _read_column("I", data, offset, count)
+    for i in range(count):
+        asteroid = sim._create_asteroid((motion[i * 4], motion[i * 4 + 1]), sizes[i], handles[i])
+        asteroid.velocity = Vector2(motion[i * 4 + 2], motion[i * 4 + 3])
+        if sim.far_updates:
+            sim.asteroid_groups[handles[i] % sim.FAR_UPDATE_INTERVAL][asteroid] = last_moved[i]
+    sim.asteroids.next_handle = next_handle
+
+    next_handle, count = LIST.unpack_from(data, offset)
+    handles, offset = _read_column("I", data, offset + LIST.size, count)
+    motion, offset = _read_column("d", data, offset, count * 4)
+    for i in range(count):
+        sim._create_bullet((motion[i * 4], motion[i * 4 + 1]), (motion[i * 4 + 2], motion[i * 4 + 3]), handles[i])
+    sim.bullets.next_handle = next_handle
+
+    next_handle, count = LIST.unpack_from(data, offset)
+    handles, offset = _read_column("I", data, offset + LIST.size, count)
+    types, offset = _read_column("B", data, offset, count)
+    positions, offset = _read_column("d", data, offset, count * 2)
+    for i in range(count):
+        powerup_type = POWERUP_TYPES[types[i]]
+        sim.powerups.add(sim.pools[powerup_type].acquire((positions[i * 2], positions[i * 2 + 1])), handles[i])
+    sim.powerups.next_handle = next_handle
+
+    # Creating the asteroids drew random velocities, so the generator is put back last
+    sim.rng.setstate(rng_state)
+
+
+# Keeps the states of the last capacity ticks, so the game can be wound back to any of them.
+# With max_bytes the oldest states are also dropped once they take up more memory than that
+class Rewind:
+
+    def __init__(self, capacity=600, max_bytes=None):
+        self.states = deque()
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.size = 0
+
+    def __len__(self):
+        return len(self.states)
+
+    # Saves the state of the simulation, the oldest states are dropped once the buffer is full
+    def record(self, sim):
+        state = save_state(sim)
+        self.states.append(state)
+        self.size += len(state)
+        while len(self.states) > self.capacity or (self.max_bytes is not None and self.size > self.max_bytes
+                                                   and len(self.states) > 1):
+            self.size -= len(self.states.popleft())
+
+    def clear(self):
+        self.states.clear()
+        self.size = 0
+
+    # Puts the simulation back to how it was ticks records ago, or to the oldest state kept.
+    # The states after it are dropped. Returns how many ticks were wound back
+    def rewind(self, sim, ticks):
+        ticks = min(ticks, len(self.states))
+        if not ticks:
+            return 0
+        for _ in range(ticks - 1):
+            self.size -= len(self.states.pop())
+        state = self.states.pop()
+        self.size -= len(state)
+        load_state(sim, state)
+        return ticks
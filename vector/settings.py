@@ -0,0 +1,84 @@
+import atexit
+import os
+import threading
+
+
+# Holds the options file (volume and high scores) in memory.
+# The file is read once, and changes are written on a background thread after a short delay,
+# so holding down a key only writes the file once. Writes go to a temporary file that is then renamed
+# over the options file, so a crash in the middle of a write never leaves a half written file behind
+class Settings:
+    # Seconds to wait after the last change before writing the file
+    DEBOUNCE = 1.0
+
+    def __init__(self, name="options"):
+        self.path = name + ".txt"
+        self.values = {}
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.timer = None
+        self.dirty = False
+        self.writes = 0
+
+        # Each line looks like "name = value"
+        with open(self.path, 'r') as f:
+            for line in f:
+                key, _, value = line.partition("=")
+                if key.strip():
+                    self.values[key.strip()] = int(value)
+
+        # Make sure changes are not lost if the game exits without flushing
+        atexit.register(self.flush)
+
+    @property
+    def volume(self):
+        return self.values["volume"]
+
+    @volume.setter
+    def volume(self, volume):
+        self.set("volume", volume)
+
+    # The 5 high scores, best first
+    @property
+    def high_scores(self):
+        return [self.values["score_" + str(x)] for x in range(1, 6)]
+
+    @high_scores.setter
+    def high_scores(self, scores):
+        for x in range(1, 6):
+            self.set("score_" + str(x), scores[x - 1])
+
+    # Changes a value and schedules a write, changes made within DEBOUNCE seconds of each other are written together
+    def set(self, key, value):
+        with self.lock:
+            if self.values.get(key) == value:
+                return
+            self.values[key] = value
+            self.dirty = True
+
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.DEBOUNCE, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    # Writes any pending changes right away, this is called when the game quits.
+    # Only taking a snapshot holds the lock, so the game never waits on the disk to change a value
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                if not self.dirty:
+                    return
+                text = "".join(key + " = " + str(value) + "\n" for key, value in self.values.items())
+                self.dirty = False
+
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'w') as f:
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self.writes += 1
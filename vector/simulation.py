@@ -0,0 +1,549 @@
+import argparse
+import random
+import time
+from collections import namedtuple
+from itertools import islice
+
+from pygame import Rect
+
+from models import Spaceship, Asteroid, Bullet, Shield, ShipSpeed, BulletSpeed, MultiShot
+from spatial import SpatialHash
+from spawner import AsteroidSpawner
+from pool import Pool
+from profiler import Profiler
+from containers import EntityList, EffectTimers
+from entities import EntityStore, detach
+from savestate import save_state, load_state
+from utils import wrap_position
+
+# The player's input for one tick.
+# rotate is 1 to turn clockwise and -1 to turn counter clockwise, thrust is 1 to accelerate, -1 to reverse
+# and 0 to slow down, and shots is how many times the fire button was pressed
+Controls = namedtuple("Controls", ("rotate", "thrust", "shots"), defaults=(0, 0, 0))
+
+
+# Runs the rules of the game without a window, sound or clock, so it can be driven by the interactive game
+# or run headless as fast as the CPU allows. Anything the player should see or hear is reported
+# through self.events as (name, position) pairs
+class Simulation:
+    # How close asteroids can spawn to your ship
+    MIN_ASTEROID_DISTANCE = 300
+
+    # The chance out of 10 that a destroyed asteroid drops a powerup
+    POWERUP_CHANCE = 1
+
+    # How many asteroids the round starts with, and how many are added whenever there are fewer than MIN_ASTEROIDS
+    START_ASTEROIDS = 6
+    MIN_ASTEROIDS = 8
+    RESPAWN_COUNT = 3
+
+    WORLD_SIZE = (1200, 600)
+
+    # When an active radius is given, asteroids further than that from the ship are only moved every
+    # FAR_UPDATE_INTERVAL ticks (they catch up on all the ticks they missed at once).
+    # Bullets further away than that are removed
+    FAR_UPDATE_INTERVAL = 30
+
+    # tuning overrides the constants above or the ones on Spaceship (e.g. {"MAX_SPEED": 8}) for every round.
+    # The profiler times the steps of each tick, by default it is disabled.
+    # active_radius is for worlds much bigger than the screen, where only the area around the ship is seen
+    def __init__(self, seed=None, size=WORLD_SIZE, use_numpy=False, tuning=None, profiler=None, active_radius=None):
+        self.size = size
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.active_radius = active_radius
+
+        # Far away asteroids are updated less often unless numpy moves them all at once anyway.
+        # Then the asteroid grid is kept up to date as asteroids move instead of being rebuilt every tick
+        self.far_updates = active_radius is not None and not use_numpy
+        self.rect = Rect((0, 0), size)
+        self.use_numpy = use_numpy
+        self.tuning = {}
+        self.spaceship_type = Spaceship
+
+        # Bullets, asteroids and powerups are reused instead of being created for every shot and split
+        self.pools = {object_type: Pool(object_type) for object_type in
+                      (Bullet, Asteroid, Shield, ShipSpeed, BulletSpeed, MultiShot)}
+        self.asteroids = EntityList()
+        self.bullets = EntityList()
+        self.powerups = EntityList()
+
+        # Picks where new asteroids go, its cells only depend on the size of the world
+        self.spawner = AsteroidSpawner(size)
+        self.reset(seed, tuning)
+
+    # Checks if name is a constant that tuning can override
+    @staticmethod
+    def is_tunable(name):
+        return name.isupper() and (hasattr(Simulation, name) or hasattr(Spaceship, name))
+
+    # Starts a new round, the same seed and inputs always play out the same way
+    def reset(self, seed=None, tuning=None):
+        if tuning is not None:
+            for name in tuning:
+                if not Simulation.is_tunable(name):
+                    raise ValueError(f"Unknown tuning parameter {name}")
+
+            # Drop the previous tuning so anything that is not tuned any more goes back to its default
+            for name in self.tuning:
+                self.__dict__.pop(name, None)
+            self.tuning = dict(tuning)
+            for name, value in self.tuning.items():
+                if hasattr(Simulation, name):
+                    setattr(self, name, value)
+
+            # Game objects have no __dict__, so the spaceship is tuned through a subclass with the new constants
+            spaceship_tuning = {name: value for name, value in self.tuning.items() if not hasattr(Simulation, name)}
+            self.spaceship_type = Spaceship
+            if spaceship_tuning:
+                self.spaceship_type = type("TunedSpaceship", (Spaceship,), dict(spaceship_tuning, __slots__=()))
+
+        self.clear(seed)
+
+        # Initialize the spaceship in the center of the world, the ship calls self._create_bullet when it fires
+        self.spaceship = self.spaceship_type((self.size[0] / 2, self.size[1] / 2), self._create_bullet)
+
+        # The game starts with a few asteroids on the screen
+        self.gen_asteroids(self.START_ASTEROIDS)
+
+    # Empties the world for a round with the given seed, without a spaceship or asteroids.
+    # reset() fills it for a new round and savestate.load_state() with a saved one
+    def clear(self, seed=None):
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.ticks = 0
+        self.score = 0
+        self.message = ""
+        self.events = []
+
+        # Statistics about the round
+        self.asteroids_destroyed = 0
+        self.powerups_collected = 0
+
+        # Hand the objects from the last round back to the pools
+        for objects in (self.asteroids, self.bullets, self.powerups):
+            for game_object in objects.clear():
+                self.pools[type(game_object)].release(game_object)
+
+        # Powerup effects that are active and how long they have left
+        self.effects = EffectTimers()
+
+        # Grids used to find nearby asteroids and powerups instead of checking every pair of objects
+        self.asteroid_grid = SpatialHash(self.size)
+        self.powerup_grid = SpatialHash(self.size)
+
+        # Asteroids created since the asteroid grid was last rebuilt, they are only sorted into it on the next tick
+        self.new_asteroids = []
+
+        # Optionally keep asteroid and bullet positions in numpy arrays so they can be processed in batches
+        self.entities = EntityStore() if self.use_numpy else None
+
+        # Asteroids split into groups that take turns being moved while far away, with the tick they were last moved
+        self.asteroid_groups = [{} for _ in range(self.FAR_UPDATE_INTERVAL)] if self.far_updates else None
+        self.spaceship = None
+
+    # The round is over when the ship was destroyed or there are no asteroids left
+    @property
+    def game_over(self):
+        return not self.spaceship or not self.asteroids
+
+    # Returns a list of objects in the game
+    def game_objects(self):
+        game_objects = [*self.asteroids, *self.bullets, *self.powerups]
+
+        if self.spaceship:
+            game_objects.append(self.spaceship)
+        return game_objects
+
+    # Applies the player's input and advances the game by one tick
+    def tick(self, controls=Controls()):
+        self.events = []
+        self.ticks += 1
+
+        if self.spaceship:
+            # Fire bullets
+            for _ in range(controls.shots):
+                self.spaceship.shoot()
+                self.events.append(("laser", self.spaceship.position))
+
+            # Turn the ship, accelerate, reverse or decelerate if there is no thrust
+            if controls.rotate:
+                self.spaceship.rotate(clockwise=controls.rotate > 0)
+            if controls.thrust > 0:
+                self.spaceship.accelerate()
+            elif controls.thrust < 0:
+                self.spaceship.reverse()
+            else:
+                self.spaceship.decelerate()
+
+        self._process_game_logic()
+
+    # Runs the game as fast as possible with a stream of Controls, until the round ends,
+    # the inputs run out or max_ticks have passed. Returns how fast the ticks were processed
+    def run(self, inputs, max_ticks=None):
+        start = time.perf_counter()
+        ticks = 0
+        profiler = self.profiler
+        for controls in inputs:
+            if self.game_over or ticks == max_ticks:
+                break
+            profiler.begin_frame()
+            with profiler.section("logic"):
+                self.tick(controls)
+            profiler.end_frame(self.entity_counts() if profiler.enabled else None)
+            ticks += 1
+        seconds = time.perf_counter() - start
+        return {
+            "ticks": ticks,
+            "seconds": seconds,
+            "ticks_per_second": ticks / seconds if seconds else 0,
+        }
+
+    # Main logic is processed here every tick, each step is timed separately when profiling
+    def _process_game_logic(self):
+        profiler = self.profiler
+        with profiler.section("move"):
+            self._move_objects()
+        with profiler.section("collide"):
+            self._handle_collisions()
+        with profiler.section("cull"):
+            self._remove_offscreen_bullets()
+        with profiler.section("spawn"):
+            self._update_round()
+        with profiler.section("cleanup"):
+            self._release_removed()
+
+    def _move_objects(self):
+        # Move current game objects, asteroids and bullets are moved all at once when they are stored in arrays
+        if self.entities is not None:
+            self.entities.move(self.size)
+            for game_object in self.powerups:
+                game_object.move(self.size)
+            if self.spaceship:
+                self.spaceship.move(self.size)
+        elif self.far_updates:
+            self._move_asteroids_by_distance()
+            for game_object in [*self.bullets, *self.powerups]:
+                game_object.move(self.size)
+            if self.spaceship:
+                self.spaceship.move(self.size)
+        else:
+            for game_object in self.game_objects():
+                game_object.move(self.size)
+
+        # Sort the asteroids and powerups into the grids after they have moved.
+        # Asteroids destroyed this tick stay in the grid, so candidates are checked against self.asteroids
+        if self.entities is None and not self.far_updates:
+            self.asteroid_grid.rebuild(self.asteroids)
+            self.new_asteroids.clear()
+        self.powerup_grid.rebuild(self.powerups)
+
+    # Moves the asteroids near the ship every tick, and a group of the far away ones by all the ticks since
+    # they last moved, so an asteroid ends up in the same place however often it was moved
+    def _move_asteroids_by_distance(self):
+        grid = self.asteroid_grid
+        groups = self.asteroid_groups
+        interval = self.FAR_UPDATE_INTERVAL
+        ticks = self.ticks
+
+        near = grid.query(self.spaceship.position, self.active_radius) if self.spaceship else []
+        for asteroid in near:
+            group = groups[asteroid.handle % interval]
+            asteroid.position = wrap_position(asteroid.position + asteroid.velocity * (ticks - group[asteroid]),
+                                              self.size)
+            group[asteroid] = ticks
+            grid.update(asteroid)
+
+        group = groups[ticks % interval]
+        for asteroid, last_moved in group.items():
+            if last_moved != ticks:
+                asteroid.position = wrap_position(asteroid.position + asteroid.velocity * (ticks - last_moved),
+                                                  self.size)
+                grid.update(asteroid)
+        for asteroid in group:
+            group[asteroid] = ticks
+
+    def _handle_collisions(self):
+        # Game ends if ship hits an asteroid
+        if self.spaceship:
+            for asteroid in self._nearby_asteroids(self.spaceship):
+                if asteroid.collides_with(self.spaceship):
+
+                    # Check to see if the player has a shield, if yer, remove it and provide points
+                    if "shield" in self.effects:
+                        self.effects.remove("shield")
+                        self._remove_asteroid(asteroid)
+                        self.asteroids_destroyed += 1
+                        key = {3: 700, 2: 300, 1: 100}
+                        self.score += key[asteroid.size]
+
+                    # If there is no shield, display lose message and end the round
+                    else:
+                        self.events.append(("ship_explosion", self.spaceship.position))
+                        self.events.append(("game_over", self.spaceship.position))
+                        self.spaceship = None
+                        self.message = "You Lost!"
+                        break
+
+        # Applies different powerups when the ship touches them
+        if self.spaceship:
+            for powerup in self.powerup_grid.query(self.spaceship.position, self.spaceship.radius):
+                if powerup.collides_with(self.spaceship):
+                    self.events.append(("powerup", powerup.position))
+                    self.powerups_collected += 1
+
+                    # Shields and multi-shot last for a number of ticks, picking them up again restarts the timer
+                    if type(powerup) == Shield:
+                        self.effects.refresh("shield", self.ticks, 600)
+                    elif type(powerup) == ShipSpeed:
+                        self.spaceship.acceleration += .1
+                    elif type(powerup) == BulletSpeed:
+                        self.spaceship.bullet_speed += .5
+                    elif type(powerup) == MultiShot:
+                        self.spaceship.bullet_amount = 3
+                        self.effects.refresh("multi", self.ticks, 200)
+
+                    # Once picked up, remove the powerup from the screen
+                    self.powerups.remove(powerup)
+
+            # Limit max bullet speed
+            if self.spaceship.bullet_speed > 6:
+                self.spaceship.bullet_speed = 6
+
+        # Handles asteroids splitting if hit with a bullet.
+        # The pieces of asteroids shot earlier in this pass can be hit by the bullets after them, but the grid
+        # and the overlap matrix were made before they existed. They are checked after the other candidates,
+        # the same order they have in self.asteroids. A large world's grid already has them, they are inserted
+        # as they are created
+        candidates = self._asteroids_near_bullets()
+        pieces = []
+        for bullet in self.bullets:
+            if candidates is None:
+                nearby = self.asteroid_grid.query(bullet.position, bullet.radius)
+            else:
+                nearby = candidates.get(bullet, [])
+            if pieces:
+                nearby = [*nearby, *pieces]
+
+            for asteroid in nearby:
+                if asteroid in self.asteroids and asteroid.collides_with(bullet):
+                    self.asteroids_destroyed += 1
+                    self._remove_asteroid(asteroid)
+                    self._remove_bullet(bullet)
+                    self.events.append(("rock_break", asteroid.position))
+                    first_piece = self.asteroids.next_handle
+                    asteroid.split()
+                    if not self.far_updates:
+                        pieces += [self.asteroids.get(handle) for handle in range(first_piece,
+                                                                                  self.asteroids.next_handle)]
+                    if self.spaceship:
+                        self.score += 100
+
+                    # Chance to randomly generate a powerup when an asteroid is hit
+                    chance = self.rng.randint(1, 10)
+                    if chance <= self.POWERUP_CHANCE:
+                        chance = self.rng.randint(1, 4)
+                        if chance == 1:
+                            self.powerups.add(self.pools[MultiShot].acquire(bullet.position))
+                        elif chance == 2:
+                            self.powerups.add(self.pools[ShipSpeed].acquire(bullet.position))
+                        elif chance == 3:
+                            self.powerups.add(self.pools[BulletSpeed].acquire(bullet.position))
+                        else:
+                            self.powerups.add(self.pools[Shield].acquire(bullet.position))
+                    break
+
+    # Remove bullets that have left the screen
+    def _remove_offscreen_bullets(self):
+        if self.entities is not None:
+            slots = [bullet.slot for bullet in self.bullets]
+            outside = self.entities.outside(slots, self.size)
+            for bullet, gone in zip(self.bullets, outside):
+                if gone:
+                    self._remove_bullet(bullet)
+        else:
+            for bullet in self.bullets:
+                if not self.rect.collidepoint(bullet.position):
+                    self._remove_bullet(bullet)
+
+        # In a large world bullets are also removed once they are far enough from the ship that nobody sees them
+        if self.active_radius is not None and self.spaceship:
+            position = self.spaceship.position
+            for bullet in self.bullets:
+                if bullet.position.distance_to(position) > self.active_radius:
+                    self._remove_bullet(bullet)
+
+    # Checks for a win, ends powerup effects and keeps enough asteroids on the screen
+    def _update_round(self):
+        # If the player manages to destroy all asteroid, they win.
+        # This is legacy code from before the game generated new asteroids over time
+        # This could be removed, or changed to trigger a win state when a certain score is triggered
+        if not self.asteroids and self.spaceship:
+            self.message = "You Won!"
+            self.events.append(("game_over", self.spaceship.position))
+
+        # Remove powerups whose time is up
+        for effect in self.effects.expire(self.ticks):
+            if effect == "multi" and self.spaceship:
+                self.spaceship.bullet_amount = 1
+
+        # Generate new asteroids if there are less than 8 on the screen
+        if self.spaceship and len(self.asteroids) < self.MIN_ASTEROIDS:
+            self.gen_asteroids(self.RESPAWN_COUNT)
+
+    # Drop everything that was removed this tick, nothing uses those objects anymore so they go back to their pools
+    def _release_removed(self):
+        for objects in (self.asteroids, self.bullets, self.powerups):
+            for game_object in objects.flush():
+                self.pools[type(game_object)].release(game_object)
+
+    # Returns the asteroids that might be touching the ship, in the same order as self.asteroids
+    def _nearby_asteroids(self, game_object):
+        if self.entities is not None:
+            asteroids = list(self.asteroids)
+            hits = self.entities.overlapping([asteroid.slot for asteroid in asteroids], game_object.position,
+                                             game_object.radius)
+            return [asteroid for asteroid, hit in zip(asteroids, hits) if hit]
+        return self.asteroid_grid.query(game_object.position, game_object.radius)
+
+    # Returns the asteroids that might be within distance of a position, e.g. to look around the ship.
+    # Like the grid, the arrays are checked against a square that wraps around the edges of the world.
+    # The grid still holds asteroids destroyed during the last tick, so they are left out, and the asteroids
+    # created since it was rebuilt (like the pieces of the ones that were shot) are added
+    def asteroids_near(self, position, distance):
+        if self.entities is not None:
+            asteroids = list(self.asteroids)
+            x, y = position
+            hits = self.entities.inside_view([asteroid.slot for asteroid in asteroids], x - distance, y - distance,
+                                             (distance * 2, distance * 2), self.size)
+            return [asteroid for asteroid, hit in zip(asteroids, hits) if hit]
+        candidates = dict.fromkeys([*self.asteroid_grid.query(position, distance), *self.new_asteroids])
+        return [asteroid for asteroid in candidates if asteroid in self.asteroids]
+
+    # When using arrays, finds the asteroids that might be touching each bullet with one batched overlap test
+    # and returns them keyed by bullet. Returns None when the grid should be queried instead
+    def _asteroids_near_bullets(self):
+        if self.entities is None:
+            return None
+
+        candidates = {}
+        bullets = list(self.bullets)
+        asteroids = list(self.asteroids)
+        if bullets and asteroids:
+            hits = self.entities.overlaps([bullet.slot for bullet in bullets], [asteroid.slot for asteroid in asteroids])
+            for b, a in zip(*hits.nonzero()):
+                candidates.setdefault(bullets[b], []).append(asteroids[a])
+        return candidates
+
+    # Creates objects from their pools, these are passed to the spaceship and asteroids as callbacks
+    # handle is only given when a saved object is put back
+    def _create_bullet(self, position, velocity, handle=None):
+        bullet = self.pools[Bullet].acquire(position, velocity, self.entities)
+        self.bullets.add(bullet, handle)
+        return bullet
+
+    def _create_asteroid(self, position, size=3, handle=None):
+        asteroid = self.pools[Asteroid].acquire(position, self._create_asteroid, size, self.entities, self.rng)
+        self.asteroids.add(asteroid, handle)
+        if self.far_updates:
+            self.asteroid_grid.insert(asteroid)
+            self.asteroid_groups[asteroid.handle % self.FAR_UPDATE_INTERVAL][asteroid] = self.ticks
+        elif self.entities is None:
+            self.new_asteroids.append(asteroid)
+        return asteroid
+
+    # Removes objects from the game and frees their rows in the entity store.
+    # The objects are only dropped from their lists at the end of the tick
+    def _remove_asteroid(self, asteroid):
+        self.asteroids.remove(asteroid)
+        detach(asteroid)
+        if self.far_updates:
+            self.asteroid_grid.remove(asteroid)
+            del self.asteroid_groups[asteroid.handle % self.FAR_UPDATE_INTERVAL][asteroid]
+
+    def _remove_bullet(self, bullet):
+        self.bullets.remove(bullet)
+        detach(bullet)
+
+    # Returns the live, free and high water counts of each pool
+    def pool_stats(self):
+        return {object_type.__name__: pool.stats() for object_type, pool in self.pools.items()}
+
+    # Returns the objects a camera can see, in the order game_objects() would return them
+    def visible_objects(self, camera):
+        if self.entities is not None:
+            candidates = list(self.asteroids)
+            seen = self.entities.inside_view([asteroid.slot for asteroid in candidates], camera.left, camera.top,
+                                             camera.view_size, self.size)
+            asteroids = [asteroid for asteroid, visible in zip(candidates, seen) if visible]
+        else:
+            if self.far_updates:
+                candidates = self.asteroid_grid.query_rect(camera.left, camera.top, *camera.view_size)
+            else:
+                candidates = self.asteroids
+            asteroids = [asteroid for asteroid in candidates if camera.sees(asteroid.position, asteroid.radius)]
+
+        game_objects = asteroids + [game_object for game_object in [*self.bullets, *self.powerups]
+                                    if camera.sees(game_object.position, game_object.radius)]
+        if self.spaceship:
+            game_objects.append(self.spaceship)
+        return game_objects
+
+    # Returns how many of each kind of object are in the game
+    def entity_counts(self):
+        return {"asteroids": len(self.asteroids), "bullets": len(self.bullets), "powerups": len(self.powerups)}
+
+    # Adds num asteroids at least MIN_ASTEROID_DISTANCE away from the spaceship, away from the other asteroids
+    # when there is room. The spawner picks the positions of the whole wave at once
+    def gen_asteroids(self, num):
+        positions = self.spawner.spawn(num, self.spaceship.position, self.MIN_ASTEROID_DISTANCE,
+                                       [asteroid.position for asteroid in self.asteroids], self.rng)
+        for position in positions:
+            self._create_asteroid(position)
+
+
+# An endless stream of random button presses, used to exercise the simulation without a player
+def random_inputs(seed=None):
+    rng = random.Random(seed)
+    while True:
+        yield Controls(rng.choice((-1, 0, 1)), rng.choice((-1, 0, 1, 1)), int(rng.random() < 0.1))
+
+
+if __name__ == "__main__":
+    # Run games headless from the game folder, e.g. "python simulation.py --games 10 --ticks 5000"
+    parser = argparse.ArgumentParser(description="Run Vector without a window")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--games", type=int, default=1)
+    parser.add_argument("--ticks", type=int, default=10000, help="maximum ticks per game")
+    parser.add_argument("--numpy", action="store_true", help="use the numpy entity store")
+    parser.add_argument("--trace", metavar="FILE", help="profile the ticks and save a Chrome trace to FILE")
+    parser.add_argument("--save", metavar="FILE", help="save the state of the first game to FILE at --save-at")
+    parser.add_argument("--save-at", type=int, default=1000, metavar="TICK")
+    parser.add_argument("--load", metavar="FILE", help="carry on with a game saved with --save, "
+                                                       "e.g. to profile just the end of a long game")
+    args = parser.parse_args()
+
+    simulation = Simulation(use_numpy=args.numpy, profiler=Profiler(enabled=bool(args.trace)))
+    if args.load:
+        with open(args.load, "rb") as f:
+            load_state(simulation, f.read())
+
+        # The game goes on with the input that comes after the tick it was saved on
+        games = [(simulation.seed, islice(random_inputs(simulation.seed), simulation.ticks, None))]
+    else:
+        games = [(args.seed + game, random_inputs(args.seed + game)) for game in range(args.games)]
+
+    for game, (seed, inputs) in enumerate(games):
+        if not args.load:
+            simulation.reset(seed)
+        if args.save and game == 0:
+            simulation.run(islice(inputs, args.save_at))
+            with open(args.save, "wb") as f:
+                f.write(save_state(simulation))
+        result = simulation.run(inputs, args.ticks - simulation.ticks)
+        print(f"seed {simulation.seed}: score {simulation.score}, {simulation.ticks} ticks, "
+              f"{result['ticks_per_second']:.0f} ticks per second")
+
+    if args.trace:
+        for line in simulation.profiler.report():
+            print(line)
+        print(f"{simulation.profiler.dump_trace(args.trace)} trace events written to {args.trace}")
@@ -0,0 +1,256 @@
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from autopilot import Autopilot
+from camera import Camera
+from simulation import Simulation
+
+# Lets the autopilot play round after round for a long time and reports whether the game stays healthy:
+# how much memory it holds on to, how many objects are in play and whether frames get slower over time.
+# Frames get slower as more objects are in play, and a long round builds up powerups that are never picked up,
+# so frame times are only compared between moments with about as many objects in play, and the object counts are
+# compared at the start of each round, where anything left over from the last round shows up.
+# The autopilot can survive for a very long time, so headless rounds are cut off after ROUND_TICKS.
+# Run it from the game folder, headless as fast as the CPU allows or in the game window at normal speed:
+#   python soak.py --minutes 60
+#   python soak.py --minutes 60 --window --report soak.json
+# Memory is measured with tracemalloc, which slows everything down, but every sample is slowed down the same way
+
+
+# Takes a sample of the session every interval seconds and keeps the session going for duration seconds
+class SoakMonitor:
+
+    # How many KB the memory can grow by and how much slower frames can get before it counts as a problem
+    MEMORY_LIMIT = 2048
+    DRIFT_LIMIT = 0.2
+
+    # An object count at the start of a round that ends up more than ENTITY_GROWTH times as high as in the first
+    # rounds (and above ENTITY_FLOOR) is most likely a list that never gets emptied
+    ENTITY_GROWTH = 2
+    ENTITY_FLOOR = 50
+
+    # Frame times are grouped by the number of objects in play, LOAD_STEP objects to a group.
+    # A group needs MIN_FRAMES frames in a sample to count
+    LOAD_STEP = 10
+    MIN_FRAMES = 100
+
+    def __init__(self, sim, duration, interval=30):
+        self.sim = sim
+        self.duration = duration
+        self.interval = interval
+        self.samples = []
+        self.frame_times = []
+        self.load_times = {}
+        self.highest = {}
+        self.round_starts = []
+        self.last_ticks = float("inf")
+        self.start = self.last_sample = time.perf_counter()
+        tracemalloc.start()
+
+    # Records a frame (or a tick when headless), returns False once the session has run for long enough
+    def frame(self, frame_time):
+        self.frame_times.append(frame_time)
+        counts = self.sim.entity_counts()
+        highest = self.highest
+        for name, count in counts.items():
+            if count > highest.get(name, 0):
+                highest[name] = count
+        self.load_times.setdefault(sum(counts.values()) // self.LOAD_STEP, []).append(frame_time)
+
+        # The tick count goes back to 0 when a new round starts
+        ticks = self.sim.ticks
+        if ticks < self.last_ticks:
+            self.round_starts.append(counts)
+        self.last_ticks = ticks
+
+        now = time.perf_counter()
+        if now - self.last_sample >= self.interval:
+            self._sample(now)
+        return now - self.start < self.duration
+
+    def _sample(self, now):
+        times = sorted(self.frame_times)
+        last = len(times) - 1
+        current, peak = tracemalloc.get_traced_memory()
+        self.samples.append({
+            "minutes": round((now - self.start) / 60, 2),
+            "frames": len(times),
+            "frame_ms": {"mean": round(sum(times) / len(times) * 1000, 3),
+                         "p50": round(times[round(last * .5)] * 1000, 3),
+                         "p99": round(times[round(last * .99)] * 1000, 3)},
+            "frame_ms_by_load": {load * self.LOAD_STEP: round(sorted(times)[len(times) // 2] * 1000, 3)
+                                 for load, times in sorted(self.load_times.items()) if len(times) >= self.MIN_FRAMES},
+            "memory_kb": round(current / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+            "python_objects": len(gc.get_objects()),
+            "entities": dict(self.highest),
+            "pools": {name: stats["live"] + stats["free"] for name, stats in self.sim.pool_stats().items()},
+        })
+        self.frame_times = []
+        self.load_times = {}
+        self.highest = {}
+        self.last_sample = now
+
+    # Stops measuring and returns the samples and what they add up to, rounds is how many rounds were played
+    def report(self, rounds):
+        if self.frame_times:
+            self._sample(time.perf_counter())
+        tracemalloc.stop()
+        samples = self.samples
+        summary = {"minutes": samples[-1]["minutes"] if samples else 0, "rounds": rounds,
+                   "frames": sum(sample["frames"] for sample in samples), "problems": []}
+        if not samples:
+            return {"summary": summary, "samples": samples}
+
+        # The first sample includes the pools and caches filling up, so the trends start from the second one.
+        # Memory and object counts go up and down with what is in play, so the quietest moments of the first and
+        # last quarter of the session are compared: something that leaks keeps raising even the lowest values
+        steady = samples[1:] if len(samples) > 2 else samples
+        quarter = max(1, len(steady) // 4)
+        early, late = steady[:quarter], steady[-quarter:]
+        summary["memory_kb_per_hour"] = round(self._slope(steady, "memory_kb") * 60, 1)
+        summary["memory_growth_kb"] = round(min(sample["memory_kb"] for sample in late) -
+                                            min(sample["memory_kb"] for sample in early), 1)
+        summary["object_growth"] = (min(sample["python_objects"] for sample in late) -
+                                    min(sample["python_objects"] for sample in early))
+        summary["frame_drift"] = self._drift(early, late)
+        summary["max_entities"] = {name: max(sample["entities"].get(name, 0) for sample in samples)
+                                   for name in samples[-1]["entities"]}
+
+        problems = summary["problems"]
+        if summary["memory_growth_kb"] > self.MEMORY_LIMIT:
+            problems.append(f"memory grew by {summary['memory_growth_kb']:.0f} KB")
+        if summary["frame_drift"] is not None and summary["frame_drift"] > self.DRIFT_LIMIT:
+            problems.append(f"frames got {summary['frame_drift']:.0%} slower")
+
+        # The objects in play at the start of the first and last quarter of the rounds are compared
+        starts = self.round_starts
+        if len(starts) > 1:
+            quarter = max(1, len(starts) // 4)
+            for name in starts[-1]:
+                before = max(counts.get(name, 0) for counts in starts[:quarter])
+                after = max(counts.get(name, 0) for counts in starts[-quarter:])
+                if after > self.ENTITY_FLOOR and after > before * self.ENTITY_GROWTH:
+                    problems.append(f"{name} at the start of a round went from at most {before} to {after}")
+        return {"summary": summary, "samples": samples}
+
+    # How much slower the late samples' frames are than the early ones' with as many objects in play,
+    # or None if the two never had the same number of objects in play for long enough
+    @staticmethod
+    def _drift(early, late):
+        ratios = []
+        for load in {load for sample in early for load in sample["frame_ms_by_load"]}:
+            before = [sample["frame_ms_by_load"][load] for sample in early if load in sample["frame_ms_by_load"]]
+            after = [sample["frame_ms_by_load"][load] for sample in late if load in sample["frame_ms_by_load"]]
+            if after:
+                ratios.append(sorted(after)[len(after) // 2] / sorted(before)[len(before) // 2])
+        if not ratios:
+            return None
+        return round(sorted(ratios)[len(ratios) // 2] - 1, 3)
+
+    # The least squares slope of a value over the minutes of the samples
+    @staticmethod
+    def _slope(samples, key):
+        if len(samples) < 2:
+            return 0
+        xs = [sample["minutes"] for sample in samples]
+        ys = [sample[key] for sample in samples]
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        spread = sum((x - mean_x) ** 2 for x in xs)
+        if not spread:
+            return 0
+        return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+
+
+# Ticks after which a headless round is over even if the ship is still alive, 3 minutes of game time
+ROUND_TICKS = 10800
+
+
+# Plays without a window as fast as possible, a new round starts with the next seed whenever one ends
+def soak_headless(minutes, interval=30, seed=0, use_numpy=False, world_size=None, tuning=None):
+    # Like in the game, a world bigger than the screen only moves the asteroids far from the ship now and then
+    size = tuple(world_size) if world_size else Simulation.WORLD_SIZE
+    active_radius = None
+    if size != Simulation.WORLD_SIZE:
+        active_radius = Camera(Simulation.WORLD_SIZE, size).active_radius()
+    sim = Simulation(None, size, use_numpy, tuning, active_radius=active_radius)
+    sim.reset(seed)
+    autopilot = Autopilot()
+    rounds = 0
+    monitor = SoakMonitor(sim, minutes * 60, interval)
+    last_tick = time.perf_counter()
+    while True:
+        sim.tick(autopilot.controls(sim))
+        if sim.game_over or sim.ticks >= ROUND_TICKS:
+            rounds += 1
+            sim.reset(seed + rounds)
+            autopilot = Autopilot()
+        now = time.perf_counter()
+        if not monitor.frame(now - last_tick):
+            break
+        last_tick = now
+    return monitor.report(rounds)
+
+
+# Plays in the game window at the normal tick rate, with drawing, sounds and particles
+def soak_window(minutes, interval=30, use_numpy=False, world_size=None, tuning=None):
+    from game import Vector
+
+    vector = Vector(use_numpy, world_size=world_size, tuning=tuning, autopilot=Autopilot())
+    monitor = SoakMonitor(vector.sim, minutes * 60, interval)
+    vector.main_loop(monitor=monitor.frame)
+    return monitor.report(vector.rounds_played)
+
+
+def _print_report(report):
+    print(f"{'minutes':>8} {'frames':>8} {'p50 ms':>8} {'p99 ms':>8} {'memory KB':>10} {'objects':>9}  entities")
+    for sample in report["samples"]:
+        times = sample["frame_ms"]
+        entities = " ".join(f"{name} {count}" for name, count in sample["entities"].items())
+        print(f"{sample['minutes']:>8.1f} {sample['frames']:>8} {times['p50']:>8.3f} {times['p99']:>8.3f} "
+              f"{sample['memory_kb']:>10.0f} {sample['python_objects']:>9}  {entities}")
+
+    summary = report["summary"]
+    print(f"{summary['rounds']} rounds and {summary['frames']} frames in {summary['minutes']:.1f} minutes")
+    if "memory_kb_per_hour" in summary:
+        drift = summary["frame_drift"]
+        print(f"memory {summary['memory_growth_kb']:+.0f} KB ({summary['memory_kb_per_hour']:+.0f} KB per hour), "
+              f"python objects {summary['object_growth']:+}, "
+              f"frame time drift {'unknown' if drift is None else format(drift, '+.1%')}")
+    for problem in summary["problems"]:
+        print(f"problem: {problem}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Let the autopilot play Vector for a long time, "
+                                                 "run from the game folder")
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--interval", type=float, default=30, help="seconds between samples")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first headless round")
+    parser.add_argument("--window", action="store_true", help="play in the game window at normal speed")
+    parser.add_argument("--numpy", action="store_true", help="use the numpy entity store")
+    parser.add_argument("--world", metavar="WIDTHxHEIGHT", help="play in a world bigger than the screen")
+    parser.add_argument("--asteroids", type=int, help="how many asteroids each round starts with")
+    parser.add_argument("--report", metavar="FILE", help="save the samples and summary as JSON")
+    args = parser.parse_args()
+
+    world_size = tuple(int(x) for x in args.world.split("x")) if args.world else None
+    tuning = {"START_ASTEROIDS": args.asteroids} if args.asteroids else None
+    if args.window:
+        result = soak_window(args.minutes, args.interval, args.numpy, world_size, tuning)
+    else:
+        result = soak_headless(args.minutes, args.interval, args.seed, args.numpy, world_size, tuning)
+    _print_report(result)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    # Fail so the soak can run unattended, e.g. overnight in CI
+    if result["summary"]["problems"]:
+        sys.exit(1)
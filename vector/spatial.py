@@ -0,0 +1,113 @@
+from math import ceil, floor
+
+
+# A uniform grid used as a broad-phase for collision checks.
+# Objects are bucketed by the cell their position falls in, so a query only has to look at nearby cells
+# instead of every object. Cell coordinates wrap around the edges of the world the same way wrap_position does,
+# which also keeps bullets that have just left the screen inside the grid.
+# The grid can either be rebuilt from scratch every tick, or kept up to date with insert, update and remove
+# when only some of the objects move each tick (e.g. in a large world).
+class SpatialHash:
+
+    # Should be at least as big as the largest asteroid so most queries only touch a 3x3 block of cells
+    CELL_SIZE = 100
+
+    def __init__(self, size, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.columns = max(1, ceil(size[0] / cell_size))
+        self.rows = max(1, ceil(size[1] / cell_size))
+        self.cells = {}
+        self.max_radius = 0
+
+        # Objects by the index they were inserted with, and the cell and index of each object
+        self.objects = {}
+        self.locations = {}
+        self.next_index = 0
+
+    def __len__(self):
+        return len(self.objects)
+
+    # Empties the grid so it can be refilled on the next tick without allocating a new one
+    def clear(self):
+        self.cells.clear()
+        self.objects.clear()
+        self.locations.clear()
+        self.next_index = 0
+        self.max_radius = 0
+
+    # Finds the cell a position belongs to
+    def _cell(self, x, y):
+        return int(floor(x / self.cell_size)) % self.columns, int(floor(y / self.cell_size)) % self.rows
+
+    # Adds an object to the grid, objects keep the order they were inserted in
+    def insert(self, game_object):
+        index = self.next_index
+        self.next_index += 1
+        self.objects[index] = game_object
+        x, y = game_object.position
+        key = self._cell(x, y)
+        if key in self.cells:
+            self.cells[key].append(index)
+        else:
+            self.cells[key] = [index]
+        self.locations[game_object] = (key, index)
+        if game_object.radius > self.max_radius:
+            self.max_radius = game_object.radius
+
+    # Moves an object to the cell of its current position, it keeps its place in the insertion order
+    def update(self, game_object):
+        key, index = self.locations[game_object]
+        x, y = game_object.position
+        new_key = self._cell(x, y)
+        if new_key == key:
+            return
+        self.cells[key].remove(index)
+        if new_key in self.cells:
+            self.cells[new_key].append(index)
+        else:
+            self.cells[new_key] = [index]
+        self.locations[game_object] = (new_key, index)
+
+    def remove(self, game_object):
+        key, index = self.locations.pop(game_object)
+        self.cells[key].remove(index)
+        del self.objects[index]
+
+    # Clears the grid and fills it with the given objects
+    def rebuild(self, game_objects):
+        self.clear()
+        for game_object in game_objects:
+            self.insert(game_object)
+
+    # Returns the cell indices along one axis that are within reach of a coordinate
+    def _span(self, value, reach, count):
+        first = int(floor((value - reach) / self.cell_size))
+        last = int(floor((value + reach) / self.cell_size))
+        if last - first + 1 >= count:
+            return range(count)
+        return {i % count for i in range(first, last + 1)}
+
+    # Returns every object that could touch a circle at position with the given radius.
+    # The candidates are returned in insertion order so callers see them in the same order as the original list,
+    # the exact check is still left to GameObject.collides_with
+    def query(self, position, radius):
+        x, y = position
+        return self._query(x, y, radius + self.max_radius, radius + self.max_radius)
+
+    # Returns every object that could overlap a rectangle, e.g. the part of the world the camera can see.
+    # The rectangle can reach past the edges of the world, it wraps around the same way positions do
+    def query_rect(self, left, top, width, height):
+        return self._query(left + width / 2, top + height / 2, width / 2 + self.max_radius,
+                           height / 2 + self.max_radius)
+
+    def _query(self, x, y, reach_x, reach_y):
+        if not self.objects:
+            return []
+        found = []
+        for column in self._span(x, reach_x, self.columns):
+            for row in self._span(y, reach_y, self.rows):
+                cell = self.cells.get((column, row))
+                if cell:
+                    found.extend(cell)
+        found.sort()
+        return [self.objects[i] for i in found]
@@ -0,0 +1,107 @@
+import time
+from math import ceil
+
+from pygame.math import Vector2
+
+
+# Picks where new asteroids appear without trying random positions until one is far enough from the ship.
+# The world is split into cells once. For every wave the cells that are completely outside the ship's exclusion
+# radius are listed, and cells that already hold an asteroid are left out so new asteroids spread out. Each
+# asteroid of the wave takes one of those cells and a random spot inside it, so a wave costs the same every time
+# no matter how small the world or how big the exclusion radius is
+class AsteroidSpawner:
+
+    CELL_SIZE = 100
+
+    def __init__(self, size, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.columns = ceil(size[0] / cell_size)
+        self.rows = ceil(size[1] / cell_size)
+
+        # Each cell is its key and its left, top, right and bottom edges, right and bottom are not part of it
+        self.cells = []
+        for row in range(self.rows):
+            for column in range(self.columns):
+                left = column * cell_size
+                top = row * cell_size
+                self.cells.append(((column, row), left, top, min(left + cell_size, size[0]),
+                                   min(top + cell_size, size[1])))
+
+        # Counters for how much spawning costs
+        self.calls = 0
+        self.spawned = 0
+        self.fallbacks = 0
+        self.total_time = 0
+        self.max_time = 0
+        self.last_time = 0
+
+    # Returns count positions further than distance from center. occupied are the positions of the asteroids
+    # that are already there, their cells are only used once every other allowed cell is taken
+    def spawn(self, count, center, distance, occupied, rng):
+        start = time.perf_counter()
+        cx, cy = center
+        min_distance = distance * distance
+
+        # Cells whose closest point is outside the exclusion radius, every point in them is far enough away
+        allowed = []
+        for cell in self.cells:
+            _, left, top, right, bottom = cell
+            dx = max(left - cx, 0, cx - right)
+            dy = max(top - cy, 0, cy - bottom)
+            if dx * dx + dy * dy > min_distance:
+                allowed.append(cell)
+
+        size = self.cell_size
+        taken = {(int(x // size) % self.columns, int(y // size) % self.rows) for x, y in occupied}
+        free = [cell for cell in allowed if cell[0] not in taken]
+
+        if not allowed:
+            corners = self._far_corners(cx, cy, min_distance)
+            self.fallbacks += count
+            return self._record(start, count, [Vector2(corners[rng.randrange(len(corners))]) for _ in range(count)])
+
+        positions = []
+        for _ in range(count):
+            if free:
+                # Swap the picked cell with the last one so it can be dropped without shifting the list
+                index = rng.randrange(len(free))
+                cell = free[index]
+                free[index] = free[-1]
+                free.pop()
+            else:
+                cell = allowed[rng.randrange(len(allowed))]
+            _, left, top, right, bottom = cell
+            positions.append(Vector2(rng.randrange(left, right), rng.randrange(top, bottom)))
+        return self._record(start, count, positions)
+
+    def _record(self, start, count, positions):
+        elapsed = time.perf_counter() - start
+        self.calls += 1
+        self.spawned += count
+        self.total_time += elapsed
+        self.last_time = elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        return positions
+
+    # When no whole cell is far enough, asteroids go in the corners of the cells that reach past the exclusion
+    # radius. If the exclusion radius covers the whole world they go in the corner furthest away
+    def _far_corners(self, cx, cy, min_distance):
+        corners = []
+        for _, left, top, right, bottom in self.cells:
+            x = left if cx - left > right - 1 - cx else right - 1
+            y = top if cy - top > bottom - 1 - cy else bottom - 1
+            corners.append(((x - cx) ** 2 + (y - cy) ** 2, x, y))
+        far = [(x, y) for distance, x, y in corners if distance > min_distance]
+        return far or [max(corners)[1:]]
+
+    # Returns the counters as a dict, times are in milliseconds
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "spawned": self.spawned,
+            "fallbacks": self.fallbacks,
+            "avg_ms": self.total_time * 1000 / self.calls if self.calls else 0,
+            "max_ms": self.max_time * 1000,
+            "last_ms": self.last_time * 1000,
+        }
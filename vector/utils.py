@@ -1,76 +1,160 @@
 import random
 
+from pygame.display import get_surface
 from pygame.image import load
 from pygame.math import Vector2
 from pygame.mixer import Sound
-from pygame import Color
+from pygame.transform import rotozoom
+from pygame import Color, Surface, SRCALPHA, BLEND_RGBA_ADD
+
+from hud import text_cache, place_text
 
 # A file for helper functions
 
+# Sprites that have no transparency and can be converted without an alpha channel
+OPAQUE_SPRITES = {"space"}
+
+# Every sprite and sound is only read from disk once, then shared by all objects that use it.
+# Sprites are keyed by (name, scale) so the scaled asteroid variants are only created once as well
+_sprite_cache = {}
+_sound_cache = {}
+
+# Sizes of sprites that are still being loaded somewhere else, and the placeholders handed out for them meanwhile
+_expected_sizes = {}
+_placeholders = {}
+asset_stats = {"hits": 0, "misses": 0}
+
 
 # Helper function to load sprites from the assets folder
-def load_sprite(name, with_alpha=True):
-    path = f"assets/sprites/{name}.png"
-    loaded_sprite = load(path)
+def load_sprite(name, with_alpha=True, scale=1):
+    key = (name, scale)
+    if key in _sprite_cache:
+        asset_stats["hits"] += 1
+        return _sprite_cache[key]
+    asset_stats["misses"] += 1
+
+    # A sprite that is still on its way is stood in for by a transparent one of the same size,
+    # store_sprite draws the real sprite onto it once it is loaded
+    if scale == 1 and name in _expected_sizes:
+        sprite = _placeholders[key] = _convert(Surface(_expected_sizes[name], SRCALPHA), True)
+        _sprite_cache[key] = sprite
+        return sprite
+
+    # Scaled variants are built from the cached full size sprite
+    if scale != 1:
+        sprite = rotozoom(load_sprite(name, with_alpha), 0, scale)
+    else:
+        path = f"assets/sprites/{name}.png"
+        sprite = _convert(load(path), with_alpha)
+
+    _sprite_cache[key] = sprite
+    return sprite
+
 
-    if with_alpha:
-        return loaded_sprite.convert_alpha()
+# Sprites can only be converted to the display's format once there is a window,
+# the headless simulation only needs their sizes and uses them as they are
+def _convert(sprite, with_alpha):
+    if get_surface() is None:
+        return sprite
+    elif with_alpha:
+        return sprite.convert_alpha()
     else:
-        return loaded_sprite.convert()
+        return sprite.convert()
+
+
+# Pre-renders a sprite at every angle in steps of step degrees, along with the offset that centers each rotation.
+# Cached like the other sprites, so the rotations are only built once when the sprite is first loaded
+def load_rotations(name, step):
+    key = (name, "rotations", step)
+    if key in _sprite_cache:
+        asset_stats["hits"] += 1
+        return _sprite_cache[key]
+    asset_stats["misses"] += 1
+
+    sprite = load_sprite(name)
+    rotations = []
+    for i in range(round(360 / step)):
+        rotated_surface = rotozoom(sprite, i * step, 1.0)
+        rotations.append((rotated_surface, -Vector2(rotated_surface.get_size()) * 0.5))
+
+    _sprite_cache[key] = rotations
+    return rotations
+
+
+# Adds a sprite loaded somewhere else (e.g. by the AssetLoader) to the cache, converting it on the way.
+# Rotations are given as a list of surfaces and get their centering offsets here.
+# If the sprite was already loaded in the meantime, the cached one is kept.
+# A placeholder handed out by load_sprite gets the sprite drawn onto it, so the objects using it show the sprite
+def store_sprite(key, sprite, with_alpha=True):
+    _expected_sizes.pop(key[0], None)
+    placeholder = _placeholders.pop(key, None)
+    if placeholder is not None:
+        placeholder.blit(_convert(sprite, with_alpha), (0, 0), special_flags=BLEND_RGBA_ADD)
+        return
+    if key in _sprite_cache:
+        return
+    if len(key) == 3 and key[1] == "rotations":
+        sprite = [(_convert(surface, with_alpha), -Vector2(surface.get_size()) * 0.5) for surface in sprite]
+    else:
+        sprite = _convert(sprite, with_alpha)
+    _sprite_cache[key] = sprite
+
+
+# Makes load_sprite hand out a placeholder of size for a sprite that is being loaded somewhere else,
+# instead of reading it from disk itself
+def expect_sprite(name, size):
+    if (name, 1) not in _sprite_cache:
+        _expected_sizes[name] = size
+
+
+def store_sound(name, sound):
+    _sound_cache.setdefault(name, sound)
+
 
+# Returns a copy of the cache counters, misses should stop growing once the assets are preloaded
+def get_asset_stats():
+    return dict(asset_stats, sprites=len(_sprite_cache), sounds=len(_sound_cache))
 
-# When objects leave the screen, have them come back on the opposite side
-def wrap_position(position, surface):
+
+# When objects leave the world, have them come back on the opposite side
+def wrap_position(position, size):
     x, y = position
-    w, h = surface.get_size()
+    w, h = size
     return Vector2(x % w, y % h)
 
 
-# Function for generating a random location on the screen
-def get_random_position(surface):
+# Function for generating a random location in a world of the given size
+def get_random_position(size, rng=random):
     return Vector2(
-        random.randrange(surface.get_width()),
-        random.randrange(surface.get_height())
+        rng.randrange(size[0]),
+        rng.randrange(size[1])
     )
 
 
 # Generates random speed and direction
-def get_random_velocity(min_speed, max_speed):
-    speed = random.randint(min_speed, max_speed)
-    angle = random.randrange(0, 360)
+def get_random_velocity(min_speed, max_speed, rng=random):
+    speed = rng.randint(min_speed, max_speed)
+    angle = rng.randrange(0, 360)
     return Vector2(speed, 0).rotate(angle)
 
 
-# Helper function for loadign sounds from the assets folder
+# Helper function for loading sounds from the assets folder, sounds are cached the same way as sprites
 def load_sound(name):
+    if name in _sound_cache:
+        asset_stats["hits"] += 1
+        return _sound_cache[name]
+    asset_stats["misses"] += 1
+
     path = f'assets/sounds/{name}.wav'
-    return Sound(path)
+    sound = Sound(path)
+    _sound_cache[name] = sound
+    return sound
 
 
-# A function for drawing text on the screen
+# A function for drawing text on the screen, rendered text is cached so unchanged text is not rasterized again
 def print_text(surface, text, font, position, color=Color("tomato")):
-    text_surface = font.render(text, True, color)
-    rect = text_surface.get_rect()
-
-    # Collect the position of the high score
-    x = 0
-    if position[:6] == "score_":
-        x = int(position[6:])
-
-    # Preset positions used to display different types of text
-    if position == "center":
-        rect.center = Vector2(surface.get_size()) / 2
-    elif position == "top":
-        rect.center = (surface.get_width() / 2, 20)
-    elif position == "scoreboard":
-        rect.center = Vector2(surface.get_size()) / 2
-        rect.center += Vector2(0, 50)
-    elif position == ("score_" + str(x)):
-        rect.center = Vector2(surface.get_size()) / 2
-        rect.center += Vector2(0, 60 + 20 * x)
-    elif position == "volume":
-        rect.center = (surface.get_width() / 2, 50)
-    surface.blit(text_surface, rect)
+    text_surface = text_cache.render(text, font, color)
+    surface.blit(text_surface, place_text(text_surface, position, surface.get_size()))
 
 
 # A helper function to help deceleration stop at 0
@@ -85,13 +169,6 @@ def approach_zero(x, deceleration):
     return x
 
 
-# A helper function to read the options file
-def read_file(name):
-    with open(name + ".txt", 'r') as f:
-        text = f.readlines()
-    return text
-
-
 # A helper function to update the high scores
 def score_update(scores, score):
     new_scores = []
@@ -109,26 +186,3 @@ def score_update(scores, score):
             new_scores.append(s)
     new_scores = new_scores[:5]
     return new_scores
-
-
-# A helper function to write updated scores to the options file
-def write_file(name, scores):
-    with open(name + ".txt", 'r') as f:
-        text = f.readlines()
-
-    for x in range(1, 6):
-        text[x] = ("score_" + str(x) + " = " + str(scores[x - 1]) + "\n")
-
-    with open(name + ".txt", 'w') as f:
-        f.writelines(text)
-
-
-# A helper function to write updated volume to the options file
-def write_volume(volume):
-    with open("options.txt", 'r') as f:
-        text = f.readlines()
-
-    text[0] = ("volume = " + str(volume) + "\n")
-
-    with open("options.txt", 'w') as f:
-        f.writelines(text)